@@ -0,0 +1,471 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import argparse
+import calendar
+import multiprocessing
+import os
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import ledger
+from cache import query_cache
+from perf import timed
+from query import Query
+
+
+# ------------------- Parallel Aggregation -------------------
+# Full-history totals are computed as per-chunk partials (count, sum,
+# min/max, per-category and per-year tallies) that are merged afterwards.
+# Large ledgers fan the partials out over a process pool, one task per
+# group of year-month shards, so workers read their own files instead of
+# receiving pickled rows. Small ledgers stay on the serial path.
+PARALLEL_THRESHOLD = 200_000
+
+def empty_stats():
+    return {"count": 0, "total": 0.0, "min": None, "max": None, "categories": {}, "years": {}}
+
+def partial_stats(rows):
+    stats = empty_stats()
+    categories = stats["categories"]
+    years = stats["years"]
+    count = 0
+    total = 0.0
+    low = high = None
+    for amount, category, year in rows:
+        count += 1
+        total += amount
+        if low is None or amount < low:
+            low = amount
+        if high is None or amount > high:
+            high = amount
+        tally = categories.get(category)
+        if tally is None:
+            categories[category] = [1, amount]
+        else:
+            tally[0] += 1
+            tally[1] += amount
+        years[year] = years.get(year, 0.0) + amount
+    stats.update(count=count, total=total, min=low, max=high)
+    return stats
+
+def merge_stats(parts):
+    merged = empty_stats()
+    for part in parts:
+        if not part["count"]:
+            continue
+        merged["count"] += part["count"]
+        merged["total"] += part["total"]
+        if merged["min"] is None or part["min"] < merged["min"]:
+            merged["min"] = part["min"]
+        if merged["max"] is None or part["max"] > merged["max"]:
+            merged["max"] = part["max"]
+        for category, (count, total) in part["categories"].items():
+            tally = merged["categories"].setdefault(category, [0, 0.0])
+            tally[0] += count
+            tally[1] += total
+        for year, total in part["years"].items():
+            merged["years"][year] = merged["years"].get(year, 0.0) + total
+    return merged
+
+def _stat_rows(expenses):
+    return ((exp["amount"], exp["category"], exp["year"]) for exp in expenses)
+
+def _shard_stats(data_file, keys):
+    # Runs in a worker process: point the ledger at the same store first.
+    ledger.DATA_FILE = data_file
+    return partial_stats(_stat_rows(ledger.load_shards(keys)["expenses"]))
+
+def _pool(workers):
+    # fork keeps workers from re-importing the GUI module as __main__.
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+
+def _split(items, parts):
+    size = max(1, -(-len(items) // parts))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+@timed("aggregate")
+def aggregate_partitions(keys=None, workers=None):
+    partitions = ledger.load_manifest()["partitions"]
+    keys = tuple(sorted(partitions if keys is None else set(keys) & partitions.keys()))
+    return query_cache.get_or_compute("aggregate", keys, lambda: _aggregate_partitions(partitions, keys, workers))
+
+def _aggregate_partitions(partitions, keys, workers):
+    rows = sum(partitions[key]["count"] for key in keys)
+
+    workers = workers or os.cpu_count() or 1
+    pool = _pool(workers) if workers > 1 and rows >= PARALLEL_THRESHOLD else None
+    if pool is None:
+        return _shard_stats(ledger.DATA_FILE, keys)
+    with pool:
+        groups = _split(keys, workers * 2)
+        return merge_stats(pool.map(_shard_stats, [ledger.DATA_FILE] * len(groups), groups))
+
+# ------------------- Trend Series -------------------
+# Daily or weekly spend for any span comes straight from the Fenwick trees
+# (one prefix lookup per bucket). Series longer than the plot is wide are
+# thinned with largest-triangle-three-buckets, which keeps the points
+# that shape the line (spikes, dips) instead of averaging them away.
+TREND_STEPS = {"day": 1, "week": 7}
+
+def ledger_span():
+    keys = sorted(key for key in ledger.load_manifest()["partitions"] if key[:4].isdigit())
+    if not keys:
+        return None
+    first, last = keys[0], keys[-1]
+    return (ledger.month_bounds(int(first[:4]), int(first[5:7]))[0],
+            ledger.month_bounds(int(last[:4]), int(last[5:7]))[1])
+
+@timed("aggregate")
+def trend_series(first_day=None, last_day=None, category=None, bucket="day"):
+    # Returns (bucket start day, spend, running total) triples.
+    span = ledger_span()
+    if span is None:
+        return []
+    first_day = span[0] if first_day is None else first_day
+    last_day = span[1] if last_day is None else last_day
+    series = []
+    running = 0.0
+    for day, amount in daily_totals().bucket_totals(first_day, last_day, category, TREND_STEPS[bucket]):
+        running += amount
+        series.append((day, amount, running))
+    return series
+
+def lttb(points, threshold):
+    # points are (x, y) pairs sorted by x; first and last are always kept.
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle corner.
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        next_points = points[next_start:next_end]
+        avg_x = sum(p[0] for p in next_points) / len(next_points)
+        avg_y = sum(p[1] for p in next_points) / len(next_points)
+
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+# ------------------- Grouped Summaries -------------------
+# Cached group-by results over any Query; the CLI, GUI and dashboard only
+# format what comes back.
+@timed("aggregate")
+def grouped_summary(keys, query=None):
+    query = query or Query()
+    keys = tuple(keys)
+    return query_cache.get_or_compute("group_by", (keys, query.key()), lambda: ledger.group_by(query.run(), keys))
+
+def month_category_totals(year, month):
+    groups = grouped_summary(("category",), Query().in_month(year, month))
+    return {group[0]: stats["sum"] for group, stats in groups.items()}
+
+# ------------------- Date-Range Totals -------------------
+# Spending is bucketed per day into Fenwick trees (one overall, one per
+# category, plus matching record counts), so the total for any
+# [first_day, last_day] costs O(log D) where D is the number of days
+# covered. The trees follow ledger change events; a write outside the
+# covered span or an out-of-order version triggers a rebuild on next read.
+# Writes land on whatever thread saved them (the API commits on a worker
+# thread), so updates and reads of one DailyTotals hold its lock.
+DAY_PADDING = 366
+
+class FenwickTree:
+    def __init__(self, values):
+        # Linear-time build from per-bucket values.
+        self.size = len(values)
+        self.tree = [0.0] + list(values)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        # Sum of buckets [0, index].
+        total = 0.0
+        i = min(index, self.size - 1) + 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, lo, hi):
+        if hi < lo or hi < 0 or lo >= self.size:
+            return 0.0
+        return self.prefix(hi) - (self.prefix(lo - 1) if lo > 0 else 0.0)
+
+class DailyTotals:
+    def __init__(self, rows):
+        rows = [(exp["day"], exp["category"].lower(), exp["amount"])
+                for exp in rows if exp["day"] > 0]
+        days = [day for day, _, _ in rows]
+        self.first_day = (min(days) if days else date.today().toordinal()) - DAY_PADDING
+        size = (max(days) if days else self.first_day) - self.first_day + 2 * DAY_PADDING + 1
+
+        amounts = defaultdict(lambda: [0.0] * size)
+        counts = defaultdict(lambda: [0] * size)
+        for day, category, amount in rows:
+            i = day - self.first_day
+            for key in (None, category):
+                amounts[key][i] += amount
+                counts[key][i] += 1
+        self.size = size
+        self.amounts = {key: FenwickTree(values) for key, values in amounts.items()}
+        self.counts = {key: FenwickTree(values) for key, values in counts.items()}
+        self.version = None
+        self.lock = threading.RLock()
+
+    def covers(self, day):
+        return 0 <= day - self.first_day < self.size
+
+    def apply(self, exp, sign):
+        day = exp["day"]
+        if day <= 0:
+            return True
+        if not self.covers(day):
+            return False
+        i = day - self.first_day
+        for key in (None, exp["category"].lower()):
+            if key not in self.amounts:
+                self.amounts[key] = FenwickTree([0.0] * self.size)
+                self.counts[key] = FenwickTree([0] * self.size)
+            self.amounts[key].add(i, sign * exp["amount"])
+            self.counts[key].add(i, sign)
+        return True
+
+    def _span(self, first_day, last_day):
+        return first_day - self.first_day, last_day - self.first_day
+
+    def total(self, first_day, last_day, category=None):
+        with self.lock:
+            tree = self.amounts.get(category.lower() if category else None)
+            return tree.range_sum(*self._span(first_day, last_day)) if tree else 0.0
+
+    def count(self, first_day, last_day, category=None):
+        with self.lock:
+            tree = self.counts.get(category.lower() if category else None)
+            return int(round(tree.range_sum(*self._span(first_day, last_day)))) if tree else 0
+
+    def running_totals(self, first_day, last_day, category=None, step=1):
+        # Cumulative spend within the range, sampled every `step` days.
+        with self.lock:
+            tree = self.amounts.get(category.lower() if category else None)
+            if tree is None:
+                return []
+            lo, hi = self._span(first_day, last_day)
+            base = tree.prefix(lo - 1) if lo > 0 else 0.0
+            points = [(first_day + i - lo, tree.prefix(i) - base) for i in range(lo, hi + 1, step)]
+            if points and points[-1][0] != last_day:
+                points.append((last_day, tree.prefix(hi) - base))
+            return points
+
+    def bucket_totals(self, first_day, last_day, category=None, step=1):
+        # Spend per consecutive `step`-day bucket, keyed by its first day.
+        with self.lock:
+            tree = self.amounts.get(category.lower() if category else None)
+            lo, hi = self._span(first_day, last_day)
+            if tree is None or hi < lo:
+                return []
+            previous = tree.prefix(lo - 1) if lo > 0 else 0.0
+            buckets = []
+            for start in range(lo, hi + 1, step):
+                current = tree.prefix(min(start + step - 1, hi))
+                buckets.append((first_day + start - lo, current - previous))
+                previous = current
+            return buckets
+
+_daily = [None]
+_daily_build_lock = threading.Lock()
+
+@timed("aggregate")
+def daily_totals():
+    # One build at a time; threads that waited reuse its result.
+    with _daily_build_lock:
+        version = ledger.data_version()
+        totals = _daily[0]
+        if totals is None or totals.version != version:
+            totals = DailyTotals(ledger.normalize_expense(dict(row)) for row in ledger.iter_rows())
+            totals.version = version
+            _daily[0] = totals
+        return totals
+
+def _on_daily_change(event, rows):
+    totals = _daily[0]
+    if totals is None:
+        return
+    version = ledger.data_version()
+    with totals.lock:
+        ok = totals.version == version - 1
+        for row in rows:
+            if not ok:
+                break
+            if event == "add":
+                ok = totals.apply(row, 1)
+            elif event == "delete":
+                ok = totals.apply(row, -1)
+            elif event == "update":
+                ok = totals.apply(row[0], -1) and totals.apply(row[1], 1)
+        totals.version = version if ok else None
+
+ledger.subscribe(_on_daily_change)
+
+# ------------------- Pivot -------------------
+# Category x month cross-tab. Every row is encoded once as a flat cell
+# index (category code * months + month offset) and the amounts are summed
+# per cell with a single weighted bincount. numpy ships with matplotlib;
+# without it the same encoding is summed in a plain loop.
+def _pivot_cells(cells, amounts, size):
+    if np is not None:
+        return np.bincount(np.asarray(cells, dtype=np.int64), weights=np.asarray(amounts, dtype=np.float64),
+                           minlength=size).tolist()
+    sums = [0.0] * size
+    for cell, amount in zip(cells, amounts):
+        sums[cell] += amount
+    return sums
+
+@timed("aggregate")
+def category_month_pivot(first_day=None, last_day=None):
+    query = Query().between_days(first_day, last_day)
+    return query_cache.get_or_compute("pivot", query.key(), lambda: _category_month_pivot(query.run()))
+
+def year_pivot(year):
+    pivot = category_month_pivot(*ledger.year_bounds(year))
+    if pivot["months"] and len(pivot["months"]) < 12:
+        # Always show the full calendar year.
+        return _pad_months(pivot, [ledger.period_key(year, m) for m in range(1, 13)])
+    return pivot
+
+def _category_month_pivot(expenses):
+    codes = {}
+    category_codes, month_indexes, amounts = [], [], []
+    for exp in expenses:
+        if exp["year"]:
+            category = exp["category"]
+            code = codes.get(category)
+            if code is None:
+                code = codes[category] = len(codes)
+            category_codes.append(code)
+            month_indexes.append(exp["year"] * 12 + exp["month"] - 1)
+            amounts.append(exp["amount"])
+    if not amounts:
+        return _with_totals([], [], [])
+
+    first = min(month_indexes)
+    width = max(month_indexes) - first + 1
+    if np is not None:
+        cells = np.asarray(category_codes, dtype=np.int64) * width + np.asarray(month_indexes, dtype=np.int64) - first
+    else:
+        cells = [code * width + index - first for code, index in zip(category_codes, month_indexes)]
+    sums = _pivot_cells(cells, amounts, len(codes) * width)
+
+    categories = sorted(codes)
+    matrix = [sums[codes[c] * width:(codes[c] + 1) * width] for c in categories]
+    months = [ledger.period_key((first + i) // 12, (first + i) % 12 + 1) for i in range(width)]
+    return _with_totals(categories, months, matrix)
+
+def _with_totals(categories, months, matrix):
+    column_totals = [sum(column) for column in zip(*matrix)] if matrix else [0.0] * len(months)
+    row_totals = [sum(row) for row in matrix]
+    return {
+        "categories": categories,
+        "months": months,
+        "cells": matrix,
+        "row_totals": row_totals,
+        "column_totals": column_totals,
+        "total": sum(row_totals, 0.0),
+    }
+
+def _pad_months(pivot, months):
+    position = {month: i for i, month in enumerate(pivot["months"])}
+    matrix = [[row[position[m]] if m in position else 0.0 for m in months] for row in pivot["cells"]]
+    return _with_totals(pivot["categories"], months, matrix)
+
+def format_group_key(key, value):
+    if key == "day":
+        return ledger.day_to_str(value)
+    if key == "month":
+        return calendar.month_abbr[value] if value else "Unknown"
+    if key == "weekday":
+        return calendar.day_abbr[value] if value >= 0 else "Unknown"
+    return str(value or "Unknown")
+
+def format_pivot(pivot, currency=""):
+    if not pivot["categories"]:
+        return "No expenses recorded."
+    width = max(12, *(len(c) for c in pivot["categories"]))
+    cell = max(10, len(f"{pivot['total']:.0f}") + 2)
+    lines = [f"{'Category':<{width}}" + "".join(f"{m:>{cell}}" for m in pivot["months"]) + f"{'Total':>{cell + 4}}"]
+    for category, row, total in zip(pivot["categories"], pivot["cells"], pivot["row_totals"]):
+        lines.append(f"{category:<{width}}" + "".join(f"{v:>{cell}.0f}" for v in row) + f"{currency + format(total, '.2f'):>{cell + 4}}")
+    lines.append(f"{'Total':<{width}}" + "".join(f"{v:>{cell}.0f}" for v in pivot["column_totals"])
+                 + f"{currency + format(pivot['total'], '.2f'):>{cell + 4}}")
+    return "\n".join(lines)
+
+def format_groups(groups, keys, currency=""):
+    if not groups:
+        return "No expenses recorded."
+    width = max(12, *(len(" / ".join(format_group_key(k, v) for k, v in zip(keys, group))) for group in groups))
+    header = " / ".join(key.title() for key in keys) or "All"
+    lines = [f"{header:<{width}} {'Count':>8} {'Total':>14} {'Mean':>12} {'Min':>12} {'Max':>12}"]
+    for group in sorted(groups):
+        stats = groups[group]
+        label = " / ".join(format_group_key(k, v) for k, v in zip(keys, group)) or "All"
+        sum_, mean, low, high = (f"{currency}{stats[field]:.2f}" for field in ("sum", "mean", "min", "max"))
+        lines.append(f"{label:<{width}} {stats['count']:>8} {sum_:>14} {mean:>12} {low:>12} {high:>12}")
+    return "\n".join(lines)
+
+def format_stats(stats, currency=""):
+    if not stats["count"]:
+        return "No expenses recorded."
+    lines = [
+        f"Total number of expenses: {stats['count']}",
+        f"Total amount spent: {currency}{stats['total']:.2f}",
+        f"Average expense amount: {currency}{stats['total'] / stats['count']:.2f}",
+        f"Lowest / highest expense: {currency}{stats['min']:.2f} / {currency}{stats['max']:.2f}",
+        "\nBy year:",
+    ]
+    for year, total in sorted(stats["years"].items()):
+        lines.append(f"  {year or 'Unknown'}: {currency}{total:.2f}")
+    lines.append("\nBy category:")
+    for category, (count, total) in sorted(stats["categories"].items(), key=lambda item: -item[1][1]):
+        lines.append(f"  {category}: {currency}{total:.2f} ({count} records)")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-history expense totals.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--group-by", nargs="+", choices=sorted(ledger.GROUP_KEYS), default=None,
+                        help="print count/total/mean/min/max per group instead")
+    parser.add_argument("--pivot", type=int, metavar="YEAR", default=None,
+                        help="print the category x month table for a year")
+    args = parser.parse_args()
+    if args.pivot:
+        print(format_pivot(year_pivot(args.pivot)))
+    elif args.group_by:
+        print(format_groups(grouped_summary(args.group_by), args.group_by))
+    else:
+        print(format_stats(aggregate_partitions(workers=args.workers)))
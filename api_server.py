@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import signal
+from urllib.parse import parse_qs, urlsplit
+
+import ledger
+from analytics import daily_totals, format_group_key, year_pivot
+from perf import timer
+from query import LedgerIndex, Query
+
+
+# ------------------- Warm Store -------------------
+# The server keeps one parsed copy of the ledger and its LedgerIndex in
+# memory. Its own committed batches are patched in on the event loop; a
+# write from another process moves the manifest version past the store's
+# and triggers one reload on the next request. The reload runs on a worker
+# thread and concurrent requests share it, so the event loop keeps serving
+# other connections. While a batch is being written, reads keep serving
+# the pre-commit state instead of reloading.
+class WarmStore:
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.committing = False
+        self.reloading = None
+
+    def _load(self):
+        version = ledger.data_version()
+        with timer("api", "store_reload"):
+            index = LedgerIndex(ledger.load_data()["expenses"])
+        return index, version
+
+    async def refresh(self):
+        if self.committing and self.index is not None:
+            return self.index
+        if self.index is not None and self.version == ledger.data_version():
+            return self.index
+        future = self.reloading
+        if future is None:
+            future = self.reloading = asyncio.get_running_loop().run_in_executor(None, self._load)
+            future.add_done_callback(lambda _: setattr(self, "reloading", None))
+        index, version = await asyncio.shield(future)
+        # A batch patched in while the reload ran may already be newer.
+        if self.index is None or self.version is None or version > self.version:
+            self.index, self.version = index, version
+        return self.index
+
+    async def query(self, query):
+        return query.run(index=await self.refresh())
+
+    def added(self, rows):
+        self.committing = False
+        version = ledger.data_version()
+        if self.index is not None and self.version == version - 1:
+            for exp in rows:
+                self.index.add(exp)
+            self.version = version
+        else:
+            self.version = None
+
+# ------------------- Write Batching -------------------
+# Adds from concurrent requests are queued and committed together: the
+# first queued row opens a short window, and everything that arrives
+# within it (up to BATCH_MAX rows) goes to disk in one add_many call on a
+# worker thread, so the event loop keeps serving reads meanwhile.
+BATCH_WINDOW_S = 0.02
+BATCH_MAX = 5000
+
+class WriteBatcher:
+    def __init__(self, store):
+        self.queue = asyncio.Queue()
+        self.store = store
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def add(self, rows):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + BATCH_WINDOW_S
+            while size < BATCH_MAX:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            rows = [row for batch, _ in pending for row in batch]
+            self.store.committing = True
+            try:
+                with timer("api", "batch_commit"):
+                    added = await loop.run_in_executor(None, ledger.retry, lambda: ledger.add_many(rows))
+            except Exception as e:
+                self.store.committing = False
+                self.store.version = None
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.store.added(added)
+            start = 0
+            for batch, future in pending:
+                if not future.done():
+                    future.set_result(added[start:start + len(batch)])
+                start += len(batch)
+
+# ------------------- Requests -------------------
+EXPORT_FIELDS = ["id", "description", "amount", "date", "category"]
+MAX_BODY = 16 * 1024 * 1024
+
+class BadRequest(Exception):
+    pass
+
+def _param(params, name, convert=str):
+    values = params.get(name)
+    if not values or values[0] == "":
+        return None
+    try:
+        return convert(values[0])
+    except ValueError:
+        raise BadRequest(f"Invalid value for '{name}': {values[0]!r}")
+
+def query_from_params(params):
+    query = Query()
+    category = _param(params, "category")
+    if category:
+        query = query.where_category(category)
+    first, last = _param(params, "from", ledger.parse_day), _param(params, "to", ledger.parse_day)
+    if first is not None or last is not None:
+        query = query.between_days(first, last)
+    min_amount, max_amount = _param(params, "min", float), _param(params, "max", float)
+    if min_amount is not None:
+        query = query.amount_at_least(min_amount)
+    if max_amount is not None:
+        query = query.amount_at_most(max_amount)
+    return query.matching(_param(params, "q"))
+
+def validate_row(row):
+    if not isinstance(row, dict):
+        raise BadRequest("Each expense must be a JSON object.")
+    description = str(row.get("description", "")).strip()
+    if not description:
+        raise BadRequest("Description is required.")
+    try:
+        amount = float(row.get("amount"))
+    except (TypeError, ValueError):
+        raise BadRequest("Amount must be a number.")
+    if amount <= 0:
+        raise BadRequest("Amount must be positive.")
+    date = str(row.get("date", ""))
+    try:
+        ledger.parse_day(date)
+    except ValueError:
+        raise BadRequest(f"Invalid date {date!r}; use YYYY-MM-DD.")
+    category = ledger.normalize_category(row.get("category"))
+    return {"description": description, "amount": amount, "date": date, "category": category}
+
+def public(exp):
+    return ledger.strip_derived(exp)
+
+def range_totals(first, last, category):
+    # Runs on a worker thread: a rebuild of the day trees can take seconds,
+    # and holding the lock keeps total and count from the same state.
+    totals = daily_totals()
+    with totals.lock:
+        return {"total": totals.total(first, last, category), "count": totals.count(first, last, category)}
+
+class ApiServer:
+    def __init__(self):
+        self.store = WarmStore()
+        self.batcher = WriteBatcher(self.store)
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("POST", "/expenses"): self.add_one,
+            ("POST", "/expenses/bulk"): self.add_bulk,
+            ("GET", "/expenses"): self.list_expenses,
+            ("GET", "/summary"): self.summary,
+            ("GET", "/totals"): self.totals,
+            ("GET", "/pivot"): self.pivot,
+            ("GET", "/export"): self.export,
+        }
+
+    async def health(self, params, body):
+        index = await self.store.refresh()
+        return 200, {"status": "ok", "rows": len(index.expenses), "version": self.store.version}
+
+    async def add_one(self, params, body):
+        added = await self.batcher.add([validate_row(body)])
+        return 201, public(added[0])
+
+    async def add_bulk(self, params, body):
+        rows = body.get("expenses") if isinstance(body, dict) else body
+        if not isinstance(rows, list) or not rows:
+            raise BadRequest("Expected a non-empty list of expenses.")
+        added = await self.batcher.add([validate_row(row) for row in rows])
+        return 201, {"added": len(added), "ids": [exp["id"] for exp in added]}
+
+    async def list_expenses(self, params, body):
+        limit = _param(params, "limit", int)
+        if limit is not None and limit < 0:
+            raise BadRequest("'limit' must be zero or more.")
+        rows = await self.store.query(query_from_params(params))
+        return 200, {"count": len(rows), "expenses": [public(exp) for exp in rows[:limit]]}
+
+    async def summary(self, params, body):
+        keys = [key for key in (_param(params, "group_by") or "category").split(",") if key]
+        if any(key not in ledger.GROUP_KEYS for key in keys):
+            raise BadRequest(f"group_by must use: {', '.join(ledger.GROUP_KEYS)}")
+        groups = ledger.group_by(await self.store.query(query_from_params(params)), keys)
+        return 200, {"group_by": keys, "groups": [
+            {"key": {k: format_group_key(k, v) for k, v in zip(keys, group)}, **stats}
+            for group, stats in sorted(groups.items())
+        ]}
+
+    async def totals(self, params, body):
+        first, last = _param(params, "from", ledger.parse_day), _param(params, "to", ledger.parse_day)
+        if first is None or last is None:
+            raise BadRequest("Both 'from' and 'to' dates are required.")
+        category = _param(params, "category")
+        return 200, await asyncio.get_running_loop().run_in_executor(None, range_totals, first, last, category)
+
+    async def pivot(self, params, body):
+        year = _param(params, "year", int)
+        if year is None:
+            raise BadRequest("'year' is required.")
+        return 200, await asyncio.get_running_loop().run_in_executor(None, year_pivot, year)
+
+    async def export(self, params, body):
+        rows = await self.store.query(query_from_params(params))
+        if (_param(params, "format") or "json") == "csv":
+            out = io.StringIO()
+            writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+            return 200, out.getvalue()
+        return 200, [public(exp) for exp in rows]
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path.rstrip("/") or "/"))
+        if handler is None:
+            known = any(path == url.path for _, path in self.routes)
+            return (405 if known else 404), {"error": f"{method} {url.path} is not supported"}
+        try:
+            payload = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            return 400, {"error": "Request body is not valid JSON."}
+        try:
+            with timer("api", f"{method} {url.path}"):
+                return await handler(parse_qs(url.query), payload)
+        except BadRequest as e:
+            return 400, {"error": str(e)}
+        except ledger.ConflictError as e:
+            return 409, {"error": str(e)}
+        except TimeoutError as e:
+            return 503, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    # ------------------- HTTP -------------------
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "Request body too large."}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            data, content_type = payload.encode("utf-8"), "text/csv; charset=utf-8"
+        else:
+            data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        self.batcher.start()
+        index = await self.store.refresh()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Expense API listening on http://{host}:{port} ({len(index.expenses)} expenses loaded)", flush=True)
+        # SIGTERM stops cleanly so exit hooks (timing dumps) still run.
+        stop = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        except (NotImplementedError, AttributeError):
+            pass
+        async with server:
+            await stop.wait()
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON API over the expense ledger.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data", default=ledger.DATA_FILE, help="ledger location (default: %(default)s)")
+    args = parser.parse_args()
+    ledger.DATA_FILE = args.data
+    try:
+        asyncio.run(ApiServer().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
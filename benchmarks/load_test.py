@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import ledger
+from benchmarks.synthetic import generate_ledger
+
+
+# ------------------- Workload -------------------
+# Each client holds one keep-alive connection and loops over a weighted
+# mix of reads and writes until the time runs out.
+WORKLOAD = [
+    ("add", 20),
+    ("bulk_add", 2),
+    ("query_month", 30),
+    ("query_category", 15),
+    ("summary", 15),
+    ("totals", 15),
+    ("pivot", 3),
+]
+
+def make_request(kind, rng):
+    year, month = rng.randint(2016, 2025), rng.randint(1, 12)
+    category = rng.choice(["Food", "Home", "Work", "Entertainment", "Other"])
+    day = f"{year:04d}-{month:02d}-{rng.randint(1, 28):02d}"
+    row = {"description": "Load test", "amount": round(rng.uniform(1, 500), 2), "date": day, "category": category}
+    if kind == "add":
+        return "POST", "/expenses", row
+    if kind == "bulk_add":
+        return "POST", "/expenses/bulk", {"expenses": [row] * 50}
+    if kind == "query_month":
+        return "GET", f"/expenses?from={year:04d}-{month:02d}-01&to={day}&limit=50", None
+    if kind == "query_category":
+        return "GET", f"/expenses?category={category}&min=400&limit=50", None
+    if kind == "summary":
+        return "GET", f"/summary?group_by=category,month&from={year:04d}-01-01&to={year:04d}-12-31", None
+    if kind == "totals":
+        return "GET", f"/totals?from={year:04d}-01-01&to={day}&category={category}", None
+    return "GET", f"/pivot?year={year}", None
+
+async def send(reader, writer, method, path, payload):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+async def client(host, port, seconds, seed, latencies, errors):
+    rng = random.Random(seed)
+    kinds, weights = zip(*WORKLOAD)
+    reader, writer = await asyncio.open_connection(host, port)
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            start = time.perf_counter()
+            status = await send(reader, writer, *make_request(kind, rng))
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+            if status >= 400:
+                errors[kind] = errors.get(kind, 0) + 1
+    finally:
+        writer.close()
+
+async def run_load(host, port, clients, seconds, seed):
+    latencies, errors = {}, {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, seconds, seed + i, latencies, errors) for i in range(clients)))
+    return time.perf_counter() - start, latencies, errors
+
+# ------------------- Report -------------------
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def report(elapsed, latencies, errors):
+    total = sum(len(v) for v in latencies.values())
+    print(f"\n{total} requests in {elapsed:.1f}s = {total / elapsed:,.0f} req/s")
+    print(f"{'request':<16} {'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for kind, values in sorted(latencies.items()):
+        print(
+            f"{kind:<16} {len(values):>8} {statistics.median(values) * 1000:>9.2f}"
+            f" {percentile(values, 0.95) * 1000:>9.2f} {percentile(values, 0.99) * 1000:>9.2f} {errors.get(kind, 0):>7}"
+        )
+
+# ------------------- Server -------------------
+def start_server(workdir, rows, seed, port):
+    data = generate_ledger(rows, seed)
+    ledger.DATA_FILE = os.path.join(workdir, "expenses.json")
+    for exp in data["expenses"]:
+        ledger.normalize_expense(exp)
+    data["shards"] = None
+    ledger.save_data(data)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(root, "api_server.py"), "--port", str(port), "--data", ledger.DATA_FILE],
+        stdout=subprocess.PIPE, text=True,
+    )
+    # The server prints one line once it is listening.
+    print(server.stdout.readline().strip())
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the local expense API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent keep-alive connections")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic ledger size for the spawned server")
+    parser.add_argument("--external", action="store_true", help="target an already running server instead")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None if args.external else start_server(workdir, args.rows, args.seed, args.port)
+        try:
+            elapsed, latencies, errors = asyncio.run(run_load(args.host, args.port, args.clients, args.seconds, args.seed))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    report(elapsed, latencies, errors)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import ledger
+from query import LedgerIndex, Query
+from benchmarks.synthetic import generate_ledger
+
+
+# ------------------- Scenarios -------------------
+# Each scenario takes the prepared context and returns a zero-argument
+# callable that runs the hot path once.
+def scenario_load_data(ctx):
+    return ledger.load_data
+
+def scenario_load_month(ctx):
+    return lambda: ledger.load_data(periods=[(2025, 6)])
+
+def scenario_save_data(ctx):
+    # Drop the shard cache so every partition is compared and rewritten.
+    def run():
+        ledger.clear_partition_cache()
+        for name in os.listdir(ledger.partition_dir()):
+            os.remove(os.path.join(ledger.partition_dir(), name))
+        # A rewrite from scratch, so skip the stale-version check.
+        ctx["data"]["version"] = None
+        ledger.save_data(ctx["data"])
+    return run
+
+def scenario_add_expense(ctx):
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            ledger.add_expense("Benchmark entry", 123.0, "2025-06-15", "Food")
+    return run
+
+def scenario_filter_by_category(ctx):
+    return lambda: ledger.in_category(ctx["expenses"], "Food")
+
+def scenario_filter_by_date(ctx):
+    day = ledger.parse_day("2025-06-15")
+    return lambda: ledger.on_day(ctx["expenses"], day)
+
+def scenario_filter_by_month_year(ctx):
+    return lambda: ledger.in_month(ctx["expenses"], 2025, 6)
+
+def scenario_filter_by_amount(ctx):
+    def run():
+        ledger.amount_above(ctx["expenses"], 1000)
+        ledger.amount_below(ctx["expenses"], 100)
+        ledger.amount_between(ctx["expenses"], 100, 1000)
+    return run
+
+def scenario_combined_query(ctx):
+    query = Query().where_category("Food").in_month(2025, 3).amount_at_least(500).matching("swiggy")
+    return lambda: query.run(expenses=ctx["expenses"])
+
+def scenario_combined_query_indexed(ctx):
+    query = Query().where_category("Food").in_month(2025, 3).amount_at_least(500).matching("swiggy")
+    index = LedgerIndex(ctx["expenses"])
+    return lambda: query.run(index=index)
+
+def scenario_perform_search(ctx):
+    return lambda: ledger.search_description(ctx["expenses"], "uber")
+
+def scenario_summarize_expenses(ctx):
+    expenses = ctx["expenses"]
+
+    # Mirrors the six options of summarize_expenses.
+    def run():
+        ledger.total_amount(exp for exp in expenses if exp.get("category", "General").lower() == "food")
+        ledger.total_amount(exp for exp in expenses if exp["month"] == 6)
+        ledger.total_amount(exp for exp in expenses if exp["year"] == 2025)
+        ledger.total_amount(ledger.in_month(expenses, 2025, 6))
+        ledger.total_amount(exp for exp in expenses if exp.get("category", "General").lower() == "food" and exp["year"] == 2025)
+        ledger.total_amount(expenses)
+    return run
+
+def scenario_dashboard_metrics(ctx):
+    return lambda: ledger.dashboard_metrics(ctx["expenses"])
+
+SCENARIOS = {
+    "load_data": scenario_load_data,
+    "load_month": scenario_load_month,
+    "save_data": scenario_save_data,
+    "add_expense": scenario_add_expense,
+    "filter_by_category": scenario_filter_by_category,
+    "filter_by_date": scenario_filter_by_date,
+    "filter_by_month_year": scenario_filter_by_month_year,
+    "filter_by_amount": scenario_filter_by_amount,
+    "combined_query": scenario_combined_query,
+    "combined_query_indexed": scenario_combined_query_indexed,
+    "perform_search": scenario_perform_search,
+    "summarize_expenses": scenario_summarize_expenses,
+    "dashboard_metrics": scenario_dashboard_metrics,
+}
+
+# Disk-bound scenarios, keep their repeats low.
+SLOW_SCENARIOS = {"load_data", "save_data", "add_expense"}
+
+# ------------------- Runner -------------------
+def prepare_context(rows, seed, workdir):
+    data = generate_ledger(rows, seed)
+    ledger.DATA_FILE = os.path.join(workdir, str(rows), "expenses.json")
+    os.makedirs(ledger.partition_dir())
+    for exp in data["expenses"]:
+        ledger.normalize_expense(exp)
+    data["shards"] = None
+    ledger.save_data(data)
+    return {"rows": rows, "data": data, "expenses": data["expenses"]}
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+def run_suite(sizes, seed, repeat, selected):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in sizes:
+            ctx = prepare_context(rows, seed, workdir)
+            results[str(rows)] = {}
+            for name in selected:
+                fn = SCENARIOS[name](ctx)
+                timings, peak = measure(fn, min(repeat, 3) if name in SLOW_SCENARIOS else repeat)
+                median = statistics.median(timings)
+                results[str(rows)][name] = {
+                    "median_s": median,
+                    "min_s": min(timings),
+                    "rows_per_s": rows / median if median > 0 else float("inf"),
+                    "peak_kib": peak / 1024,
+                }
+                print_row(rows, name, results[str(rows)][name])
+    return results
+
+def print_row(rows, name, result):
+    print(
+        f"{rows:>10} {name:<24} {result['median_s'] * 1000:>10.2f} ms"
+        f" {result['rows_per_s']:>14,.0f} rows/s {result['peak_kib']:>12,.0f} KiB peak"
+    )
+
+# ------------------- Baselines -------------------
+def save_baseline(path, results, args):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Baseline saved to {path}")
+
+def compare_baseline(path, results, tolerance):
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    print(f"\nComparison against {path} (tolerance {tolerance:.0%}):")
+    for rows, scenarios in results.items():
+        for name, result in scenarios.items():
+            old = baseline.get(rows, {}).get(name)
+            if not old:
+                continue
+            ratio = result["median_s"] / old["median_s"] if old["median_s"] > 0 else 1.0
+            flag = "REGRESSION" if ratio > 1 + tolerance else ""
+            print(f"{rows:>10} {name:<24} {ratio:>6.2f}x {flag}")
+            if flag:
+                regressions.append((rows, name, ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the expense tracker hot paths on synthetic ledgers.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000],
+                        help="ledger sizes to generate (10k to 10M rows)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="run a subset of scenarios")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.seed, args.repeat, args.only or list(SCENARIOS))
+
+    if args.save:
+        save_baseline(args.save, results, args)
+    if args.compare and compare_baseline(args.compare, results, args.tolerance):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+from datetime import date
+import random
+
+
+# ------------------- Synthetic Ledger -------------------
+# Category weights, median amounts and merchant pools roughly follow a
+# household ledger: lots of small food entries, fewer large home/work ones.
+CATEGORY_PROFILES = {
+    "Food": (0.40, 250, ["Swiggy", "Zomato", "Grocery store", "Bakery", "Cafe", "Dinner out"]),
+    "Home": (0.20, 1500, ["Rent", "Electricity bill", "Water bill", "Internet", "Cleaning supplies"]),
+    "Work": (0.15, 600, ["Uber ride", "Metro card", "Office lunch", "Stationery", "Coworking pass"]),
+    "Entertainment": (0.15, 450, ["Movie tickets", "Netflix", "Concert", "Books", "Game purchase"]),
+    "Other": (0.10, 800, ["Pharmacy", "Gift", "Clothes", "Haircut", "Donation"]),
+}
+
+END_DATE = date(2025, 12, 31)
+
+def generate_expenses(rows, seed=42, years=10):
+    rng = random.Random(seed)
+    names = list(CATEGORY_PROFILES)
+    weights = [CATEGORY_PROFILES[name][0] for name in names]
+    last_day = END_DATE.toordinal()
+    first_day = last_day - 365 * years + 1
+
+    categories = rng.choices(names, weights=weights, k=rows)
+    expenses = []
+    for i, category in enumerate(categories, start=1):
+        _, median, merchants = CATEGORY_PROFILES[category]
+        # Spending is skewed: lognormal around the category median.
+        amount = round(median * rng.lognormvariate(0, 0.8), 2)
+        # Newer years are busier than older ones.
+        day = first_day + int((last_day - first_day) * rng.random() ** 0.7)
+        description = rng.choice(merchants)
+        if rng.random() < 0.2:
+            description = f"{description} #{rng.randint(1, 500)}"
+        expenses.append({
+            "id": i,
+            "description": description,
+            "amount": amount,
+            "date": date.fromordinal(day).isoformat(),
+            "category": category,
+        })
+    return expenses
+
+def generate_ledger(rows, seed=42, years=10):
+    return {"expenses": generate_expenses(rows, seed, years), "last_id": rows}
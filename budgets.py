@@ -0,0 +1,159 @@
+import ledger
+from perf import timed
+
+
+# ------------------- Budgets -------------------
+# Monthly budgets, overall and per category, come from the settings file.
+# Spending is kept as running totals per (month, category), loaded one
+# month shard at a time on first use and then moved by ledger change
+# events, so once a month is loaded, checking a new expense against its
+# budgets costs O(1). An alert fires when a write carries a total across
+# one of BUDGET_LEVELS of its budget, or when a single expense reaches the
+# alert threshold.
+BUDGET_LEVELS = (0.8, 1.0)
+OVERALL = None
+
+_config = [{"overall": None, "categories": {}, "alert_threshold": None}]
+_alert_listeners = []
+
+def configure_budgets(settings):
+    budgets = settings.get("budgets") or {}
+    _config[0] = {
+        "overall": budgets.get("overall") or None,
+        "categories": {name.lower(): amount for name, amount in (budgets.get("categories") or {}).items() if amount},
+        "alert_threshold": settings.get("alert_threshold") or None,
+    }
+
+def budget_for(category=OVERALL):
+    if category is OVERALL:
+        return _config[0]["overall"]
+    return _config[0]["categories"].get(category.lower())
+
+def subscribe_alerts(callback):
+    _alert_listeners.append(callback)
+    return callback
+
+def unsubscribe_alerts(callback):
+    if callback in _alert_listeners:
+        _alert_listeners.remove(callback)
+
+class MonthTotals:
+    def __init__(self):
+        self.months = {}
+        self.version = None
+
+    def month(self, key):
+        totals = self.months.get(key)
+        if totals is None:
+            totals = {OVERALL: 0.0}
+            for exp in ledger.load_shards([key])["expenses"]:
+                self._apply(totals, exp, 1)
+            self.months[key] = totals
+        return totals
+
+    def _apply(self, totals, exp, sign):
+        amount = sign * exp["amount"]
+        category = exp["category"].lower()
+        totals[OVERALL] += amount
+        totals[category] = totals.get(category, 0.0) + amount
+
+    def spent(self, key, category=OVERALL):
+        return self.month(key).get(category if category is OVERALL else category.lower(), 0.0)
+
+    def apply(self, exp, sign):
+        totals = self.month(ledger.shard_key(exp))
+        category = exp["category"].lower()
+        before = (totals[OVERALL], totals.get(category, 0.0))
+        self._apply(totals, exp, sign)
+        return [(OVERALL, before[0], totals[OVERALL]), (category, before[1], totals[category])]
+
+_totals = [None]
+
+@timed("aggregate")
+def month_totals():
+    version = ledger.data_version()
+    totals = _totals[0]
+    if totals is None or totals.version != version:
+        totals = MonthTotals()
+        totals.version = version
+        _totals[0] = totals
+    return totals
+
+def _crossings(exp, moves):
+    alerts = []
+    month = ledger.shard_key(exp)
+    for category, before, after in moves:
+        budget = budget_for(category)
+        if not budget or after <= before:
+            continue
+        name = "Overall" if category is OVERALL else category.title()
+        for level in reversed(BUDGET_LEVELS):
+            if before < level * budget <= after:
+                state = "over" if level >= 1 else f"at {level:.0%} of"
+                alerts.append(f"{name} spending for {month} is {state} budget ({after:.2f} / {budget:.2f}).")
+                break
+    threshold = _config[0]["alert_threshold"]
+    if threshold and exp["amount"] >= threshold:
+        alerts.append(f"Large expense: {exp['description']} ({exp['amount']:.2f}) on {exp['date']}.")
+    return alerts
+
+def _on_ledger_change(event, rows):
+    version = ledger.data_version()
+    totals = _totals[0]
+    if totals is None or totals.version != version - 1:
+        # Out of step (another process wrote): start over and load lazily.
+        totals = _totals[0] = MonthTotals()
+    if event == "update":
+        pairs = rows
+    elif event == "delete":
+        pairs = [(row, None) for row in rows]
+    else:
+        pairs = [(None, row) for row in rows]
+
+    # A month loaded now already holds this write; rewind it first so the
+    # replay below sees each row's before/after totals.
+    touched = {ledger.shard_key(exp) for pair in pairs for exp in pair if exp is not None}
+    fresh = touched - totals.months.keys()
+    for key in fresh:
+        totals.month(key)
+    for old, new in pairs:
+        if old is not None and ledger.shard_key(old) in fresh:
+            totals.apply(old, 1)
+        if new is not None and ledger.shard_key(new) in fresh:
+            totals.apply(new, -1)
+
+    alerts = []
+    for old, new in pairs:
+        if old is not None:
+            totals.apply(old, -1)
+        if new is not None:
+            moves = totals.apply(new, 1)
+            if old is None or new["amount"] > old["amount"] or new["category"] != old["category"]:
+                alerts.extend(_crossings(new, moves))
+    totals.version = version
+    if alerts:
+        for callback in list(_alert_listeners):
+            callback(alerts)
+
+ledger.subscribe(_on_ledger_change)
+
+def watch_month(year, month):
+    # Loads a month's counters so adds into it are checked as they land.
+    return month_totals().month(ledger.period_key(year, month))
+
+def budget_status(year, month):
+    key = ledger.period_key(year, month)
+    totals = month_totals()
+    rows = []
+    for category, budget in [(OVERALL, budget_for(OVERALL))] + sorted(_config[0]["categories"].items()):
+        if not budget:
+            continue
+        spent = totals.spent(key, category)
+        rows.append({
+            "name": "Overall" if category is OVERALL else category.title(),
+            "budget": budget,
+            "spent": spent,
+            "remaining": budget - spent,
+            "ratio": spent / budget,
+        })
+    return rows
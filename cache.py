@@ -0,0 +1,99 @@
+from collections import OrderedDict
+import sys
+import threading
+
+import ledger
+
+
+# ------------------- Query Cache -------------------
+# Bounded LRU cache for query and aggregate results. Keys combine a
+# namespace, the normalized query key and the ledger data version, so any
+# write makes older entries unreachable; they are dropped as soon as a new
+# version is seen. Cached values are shared and must be treated as
+# read-only by callers. A lock lets worker threads (chart preparation)
+# share the cache with the GUI thread; it is never held while computing.
+ROW_BYTES = 400
+
+def estimate_size(value):
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + len(value) * ROW_BYTES
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + len(value) * 64
+    return sys.getsizeof(value)
+
+class QueryCache:
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def configure(self, max_entries=None, max_bytes=None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        with self.lock:
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_or_compute(self, namespace, key, compute):
+        # compute runs outside the lock, so one slow build does not block
+        # hits in other namespaces; the result is stored only if no write
+        # moved the version on meanwhile.
+        version = (ledger.DATA_FILE, ledger.data_version())
+        full_key = (namespace, key)
+        with self.lock:
+            if version != self.version:
+                self.clear()
+                self.version = version
+            entry = self.entries.get(full_key)
+            if entry is not None:
+                self.entries.move_to_end(full_key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = compute()
+        size = estimate_size(value)
+        with self.lock:
+            if self.version != version or (ledger.DATA_FILE, ledger.data_version()) != version:
+                return value
+            entry = self.entries.get(full_key)
+            if entry is not None:
+                # Another thread built it first; share that copy.
+                return entry[0]
+            if size <= self.max_bytes:
+                self.entries[full_key] = (value, size)
+                self.size += size
+                self._evict()
+        return value
+
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, (_, size) = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+query_cache = QueryCache()
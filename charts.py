@@ -0,0 +1,72 @@
+from matplotlib.figure import Figure
+
+
+# ------------------- Charts -------------------
+# Chart drawing shared by the GUI, the CLI and report rendering. Everything
+# draws onto plain matplotlib Figure/Axes objects, so nothing here touches
+# pyplot's global figure list or picks a GUI backend.
+PIE_COLORS = [
+    "#8B4513",
+    "#C1B18B",
+    "#800020",
+    "#0A1172",
+    "#556B2F",
+    "#DAA520",
+    "#4B0082",
+    "#5D3A00",
+]
+
+def new_figure(width=8, height=8, dpi=100):
+    return Figure(figsize=(width, height), dpi=dpi)
+
+def draw_category_pie(ax, category_totals, title, currency=""):
+    ax.clear()
+    labels = list(category_totals.keys())
+    values = list(category_totals.values())
+    total = sum(values)
+
+    def make_label(pct):
+        absolute = int(round(pct / 100. * total))
+        return f"{pct: .2f}%\n({currency}{absolute})"
+
+    wedges, _, _ = ax.pie(
+        values, labels=None, autopct=make_label,
+        startangle=90, colors=PIE_COLORS, textprops=dict(color="black")
+    )
+    ax.legend(wedges, labels, title="Categories", loc="best")
+    ax.set_title(title)
+    ax.axis("equal")
+    return wedges
+
+def draw_message(ax, text):
+    ax.clear()
+    ax.axis("off")
+    ax.text(0.5, 0.5, text, ha="center", va="center", fontsize=13, color="gray")
+
+def draw_trend(spend_ax, cumulative_ax, spend_points, cumulative_points, title, currency=""):
+    # Points are (date, value) pairs, already thinned to the plot width.
+    for ax in (spend_ax, cumulative_ax):
+        ax.clear()
+        ax.grid(True, alpha=0.3)
+    if spend_points:
+        spend_ax.plot(*zip(*spend_points), color=PIE_COLORS[3], linewidth=1)
+    if cumulative_points:
+        cumulative_ax.plot(*zip(*cumulative_points), color=PIE_COLORS[0], linewidth=1.5)
+        cumulative_ax.fill_between(*zip(*cumulative_points), color=PIE_COLORS[1], alpha=0.3)
+    spend_ax.set_title(title)
+    spend_ax.set_ylabel(f"Spent ({currency})" if currency else "Spent")
+    cumulative_ax.set_ylabel(f"Cumulative ({currency})" if currency else "Cumulative")
+    cumulative_ax.figure.autofmt_xdate()
+
+def draw_table(ax, header, rows):
+    ax.clear()
+    ax.axis("off")
+    if not rows:
+        return None
+    table = ax.table(cellText=rows, colLabels=header, loc="upper center", cellLoc="right", colLoc="right")
+    table.auto_set_font_size(False)
+    table.set_fontsize(9)
+    table.scale(1, 1.3)
+    for col in range(len(header)):
+        table[0, col].set_text_props(weight="bold")
+    return table
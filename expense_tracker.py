@@ -1,38 +1,45 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 import json
 import csv
 import os
-import matplotlib.pyplot as plt
-from collections import defaultdict
+import shutil
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import customtkinter as ctk
 from tkinter import messagebox
 from tkcalendar import Calendar
+import perf
+from analytics import (
+    aggregate_partitions, format_stats, month_category_totals, daily_totals,
+    grouped_summary, format_groups, year_pivot, format_pivot,
+    trend_series, lttb, ledger_span,
+)
+from budgets import BUDGET_LEVELS, configure_budgets, budget_status, subscribe_alerts, watch_month
+from cache import query_cache
+from recurring import FREQUENCIES, add_rule, delete_rule, load_rules, expand, due_items, post_due, today
+from charts import new_figure, draw_category_pie, draw_message, draw_trend
+from query import Query
+from search_index import IncrementalSearch, fuzzy_store_index, group_similar_descriptions
+from sketches import usage_sketches, use_approximate, amount_quantiles
+from perf import timed, timer
+from ledger import (
+    load_data, add_expense, parse_day, month_bounds,
+    load_manifest, partition_dir, year_bounds, day_to_str, GROUP_KEYS,
+    validation_report, format_report, repair_ledger,
+    ConflictError, retry, find_record, update_record, delete_record, update_many, delete_many,
+    subscribe, unsubscribe,
+    on_day, in_month, dashboard_metrics,
+)
 
 
 # ------------------- Data Handling -------------------
-DATA_FILE = os.path.join("data", "expenses.json")
-
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r", encoding='utf-8') as file:
-            try:
-                return json.load(file)
-            except json.JSONDecodeError:
-                return {"expenses": []}
-    return {"expenses": []}
-
-def save_data(data):
-    os.makedirs("data", exist_ok=True)
-    with open(DATA_FILE, "w", encoding='utf-8') as file:
-        json.dump(data, file, indent=4)
-        
 def backup_data():
     os.makedirs("backups", exist_ok=True)
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    backup_path = os.path.join("backups", f"expenses_backup_{timestamp}.json")
+    backup_path = os.path.join("backups", f"expenses_backup_{timestamp}")
 
     try:
-        shutil.copy("data/expenses.json", backup_path)
+        shutil.copytree(partition_dir(), backup_path)
         messagebox.showinfo("Backup Successful", f"Backup saved to {backup_path}")
     except Exception as e:
         messagebox.showerror("Backup Failed", str(e))
@@ -67,97 +74,78 @@ def valid_date(date_input):
         if not date_input:
             return datetime.now().strftime("%Y-%m-%d")   
         else:
-            datetime.strptime(date_input, "%Y-%m-%d")
-            return date_input
+            # Canonical YYYY-MM-DD, so "2024-1-5" parses as a dated row.
+            return datetime.strptime(date_input, "%Y-%m-%d").date().isoformat()
     except ValueError:
         print("Invalid Date Format. Please try again.")
         return None
 
 # ------------------- Expense Logic -------------------
-def add_expense(description, amount, date, category):
-    data = load_data()
-
-    existing_ids = [exp["id"] for exp in data["expenses"] if "id" in exp]
-    new_id = max(existing_ids, default = 0) + 1
-
-    data["last_id"] = new_id
-
-    new_expense = {
-    "id": new_id,
-    "description": description,
-    "amount": amount,
-    "date": date,
-    "category": category
-    }
-
-    data["expenses"].append(new_expense)
-    save_data(data)
-
-    print(f"Expense added successfully (ID: {new_id})")
-
 def delete_expense():
-    data = load_data()
-
     try:
         delete_id = int(input("Enter The Expense ID to delete: "))
     except ValueError:
         print("Invalid input. Please enter a numeric ID.")
         return
 
-    org_length = len(data["expenses"])
-    data["expenses"] = [exp for exp in data["expenses"] if exp['id'] != delete_id]
-
-    if len(data["expenses"]) < org_length:
-        save_data(data)
-        print(f"Expense with ID {delete_id} deleted successfully.")
+    try:
+        deleted = retry(lambda: delete_record(delete_id))
+    except (ConflictError, TimeoutError) as e:
+        print(f"Could not delete expense {delete_id}: {e}")
     else:
-       print(f"No expense found with the ID {delete_id}.")   
+        if deleted:
+            print(f"Expense with ID {delete_id} deleted successfully.")
+        else:
+            print(f"No expense found with the ID {delete_id}.")
 
     input("\nPress Enter to return to the main menu...")
 
 def update_expense():
-    data = load_data()
     try:
         update_id = int(input("Enter the Expense ID to update: "))
     except ValueError:
         print("Invalid input. Please enter a numeric ID.")  
         return
 
-    for exp in data["expenses"]:
-        if exp['id'] == update_id:
-            print(f"Current details: Description: {exp['description']}, Amount: {exp['amount']}, Date: {exp['date']}, Category: {exp.get('category', 'None')}")
+    _, exp = find_record(update_id)
+    if exp is not None:
+        print(f"Current details: Description: {exp['description']}, Amount: {exp['amount']}, Date: {exp['date']}, Category: {exp.get('category', 'None')}")
+        changes = {}
 
-            new_description = input("Enter new description (if needed): ")            
-            if new_description:
-                exp['description'] = new_description
+        new_description = input("Enter new description (if needed): ")            
+        if new_description:
+            changes['description'] = new_description
 
-            new_category = input("Enter new category (if needed): ").strip().title()
-            if new_category:
-                exp['category'] = new_category
+        new_category = input("Enter new category (if needed): ").strip().title()
+        if new_category:
+            changes['category'] = new_category
 
-            while True:
-                new_amount = input("Enter new amount(if needed): ")
-                if new_amount:
-                    new_amount = valid_amount(new_amount)
-                    if new_amount is not None:
-                        exp['amount'] = new_amount
-                        break
-                else:
+        while True:
+            new_amount = input("Enter new amount(if needed): ")
+            if new_amount:
+                new_amount = valid_amount(new_amount)
+                if new_amount is not None:
+                    changes['amount'] = new_amount
                     break
+            else:
+                break
 
-            while True:
-                new_date = input("Enter new date(if needed): ")
+        while True:
+            new_date = input("Enter new date(if needed): ")
+            if new_date:
+                new_date = valid_date(new_date)
                 if new_date:
-                    new_date = valid_date(new_date)
-                    if new_date:
-                        exp['date'] = new_date
-                        break
-                else:
+                    changes['date'] = new_date
                     break
+            else:
+                break
 
-            save_data(data)
+        try:
+            retry(lambda: update_record(exp, changes))
+        except (ConflictError, TimeoutError) as e:
+            print(f"Could not update expense {update_id}: {e}")
+        else:
             print(f"Expense with ID {update_id} updated successfully.")
-            break
     else:
         print(f"No expense found with the ID {update_id}.")
     
@@ -208,7 +196,7 @@ def filter_expenses():
         filtered =[]
 
         if choice == "1":
-            unique_categories = sorted(set(exp.get("category", "General") for exp in data["expenses"]))
+            unique_categories = sorted(set(exp["category"] for exp in data["expenses"]))
             
             print("\nAvailable Categories: ")
             for i, cat in enumerate(unique_categories, 1):
@@ -218,7 +206,7 @@ def filter_expenses():
                     selected = int(input("Choose a category number: "))
                     if 1 <= selected <= len(unique_categories):
                         selected_category = unique_categories[selected - 1]
-                        filtered = [exp for exp in data["expenses"] if exp.get("category", "General").lower() ==  selected_category.lower()]
+                        filtered = [exp for exp in data["expenses"] if exp["category"].lower() ==  selected_category.lower()]
                         label = f"category '{selected_category}'"
                         break
                     else:
@@ -232,7 +220,7 @@ def filter_expenses():
                 date = input("Enter the date (YYYY-MM-DD): ").strip()
                 valid = valid_date(date)
                 if valid:
-                    filtered = [exp for exp in data["expenses"] if exp.get("date") == valid]
+                    filtered = on_day(data["expenses"], parse_day(valid))
                     label = f"date '{valid}'"
                     break
             break
@@ -241,11 +229,11 @@ def filter_expenses():
             while True:
                 month_year = input("Enter month and year (YYYY-MM): ").strip()
                 try:
-                    datetime.strptime(month_year, "%Y-%m")
+                    parsed = datetime.strptime(month_year, "%Y-%m")
                     break
                 except ValueError:
                     print("Invalid format. Please enter in YYYY-MM format.")
-            filtered = [exp for exp in data["expenses"] if exp.get("date", "").startswith(month_year)]
+            filtered = in_month(data["expenses"], parsed.year, parsed.month)
             label = f"month-year '{month_year}'"
             break
         
@@ -339,6 +327,45 @@ def filter_by_amount(expenses):
     input("\nPress Enter to return to the filter menu...")
 
 # ------------------- View GUI/Summarize -------------------
+def live_rows(window, expenses, render_row, on_remove=None):
+    # Draws one grid row per expense, then patches rows from ledger change
+    # events: a delete drops its widgets, an edit redraws only its own row
+    # and an add appends one, so the window keeps its scroll position.
+    rows = {}
+    next_row = [1]
+
+    def draw(exp, row=None):
+        if row is None:
+            row = next_row[0]
+            next_row[0] += 1
+        rows[exp["id"]] = (row, render_row(exp, row))
+
+    def remove(exp_id):
+        row, widgets = rows.pop(exp_id)
+        for widget in widgets:
+            widget.destroy()
+        return row
+
+    def on_change(event, changed):
+        if not window.winfo_exists():
+            return
+        with timer("render", "row_patch"):
+            for item in changed:
+                if event == "add":
+                    draw(item)
+                elif event == "delete" and item["id"] in rows:
+                    remove(item["id"])
+                    if on_remove is not None:
+                        on_remove(item["id"])
+                elif event == "update" and item[1]["id"] in rows:
+                    draw(item[1], remove(item[1]["id"]))
+
+    for exp in expenses:
+        draw(exp)
+    subscribe(on_change)
+    window.bind("<Destroy>", lambda event: unsubscribe(on_change) if event.widget is window else None, add="+")
+
+@timed("render")
 def view_expenses():
     data = load_data()
     expenses = data.get("expenses", [])
@@ -359,32 +386,29 @@ def view_expenses():
         label = ctk.CTkLabel(scroll_frame, text=header, font=ctk.CTkFont(weight="bold"))
         label.grid(row=0, column=col, padx=5, pady=5)
 
-    for row, exp in enumerate(expenses, start=1):
-        ctk.CTkLabel(scroll_frame, text=str(exp["id"])).grid(row=row, column=0, padx=5, pady=2)
-        ctk.CTkLabel(scroll_frame, text=exp["date"]).grid(row=row, column=1, padx=5, pady=2)
-        ctk.CTkLabel(scroll_frame, text=exp["category"]).grid(row=row, column=2, padx=5, pady=2)
-        ctk.CTkLabel(scroll_frame, text=f"{selected_currency}{exp['amount']}").grid(row=row, column=3, padx=5, pady=2)
-        ctk.CTkLabel(scroll_frame, text=exp["description"]).grid(row=row, column=4, padx=5, pady=2)
-         
-def delete_expense_by_id(exp_id, window):
-    data = load_data()
-    updated = [e for e in data["expenses"] if e["id"] != exp_id]
+    def render_row(exp, row):
+        texts = [str(exp["id"]), exp["date"], exp["category"], f"{selected_currency}{exp['amount']}", exp["description"]]
+        widgets = [ctk.CTkLabel(scroll_frame, text=text) for text in texts]
+        for col, widget in enumerate(widgets):
+            widget.grid(row=row, column=col, padx=5, pady=2)
+        return widgets
 
-    data["expenses"] = updated
-    save_data(data)
+    live_rows(view_window, expenses, render_row)
+         
+def delete_expense_by_id(exp_id, seen=None):
+    # Open list windows drop the row themselves via the delete event. seen
+    # is the row as displayed, so a record edited elsewhere is not deleted.
+    try:
+        retry(lambda: delete_record(exp_id, seen))
+    except (ConflictError, TimeoutError) as e:
+        messagebox.showerror("Delete Failed", str(e))
+        return
     messagebox.showinfo("Deleted", f"Expense with ID {exp_id} deleted.")
-    window.destroy()
-
-    if window.title() == "All Expenses":
-        view_expenses()
-    elif window.title() == "Modify Expenses":
-        modify_expense_gui()
 
 def summarize_expenses():
-    data = load_data()
-    expenses = data["expenses"] 
-
-    if not expenses:
+    # Answered from the manifest, the day trees, the sketches or a query;
+    # no choice needs every row loaded up front.
+    if not any(part["count"] for part in load_manifest()["partitions"].values()):
         print("No expenses recorded.")
         return
 
@@ -395,20 +419,29 @@ def summarize_expenses():
     print("4. By Month and Year")
     print("5. By Category and Year")
     print("6. Total Expenses Summary")
+    print("7. Median / P90 / P99 Expense")
+    print("8. Spent Between Two Dates")
+    print("9. Running Balance Between Two Dates")
+    print("10. Group Totals (count / total / mean / min / max)")
+    print("11. Category x Month Table for a Year")
 
     choice = input("Enter your choice number: ")
+    totals = daily_totals() if choice in ("2", "3", "4", "5", "8", "9") else None
 
     if choice == "1":
         category = input("Enter the category to summarize: ").strip()
-        filtered = [exp for exp in data["expenses"] if exp.get("category", "General").lower() == category.lower()]
+        query = Query().where_category(category)
+        filtered = query.run()
 
         if not filtered:
             print(f"No expenses found for category: {category}")
         else:
-            total = sum(exp["amount"] for exp in filtered)
+            stats = grouped_summary((), query)[()]
             print(f"\nSummary for Category: {category}")
-            print(f"Total Expenses: {selected_currency}{total}")
-            print(f"Number of Records: {len(filtered)}")
+            print(f"Total Expenses: {selected_currency}{stats['sum']:.2f}")
+            print(f"Number of Records: {stats['count']}")
+            print(f"Average / Lowest / Highest: {selected_currency}{stats['mean']:.2f} / "
+                  f"{selected_currency}{stats['min']:.2f} / {selected_currency}{stats['max']:.2f}")
             for exp in filtered:
                 print(f"  ID: {exp['id']} | {selected_currency}{exp['amount']} | {exp['date']} | {exp['description']}")
 
@@ -421,14 +454,17 @@ def summarize_expenses():
                 continue
 
             month_input = month_input.zfill(2)
-            filtered = [exp for exp in expenses if exp.get("date","")[5:7] == month_input]
+            month = int(month_input)
+            years = sorted({int(key[:4]) for key in load_manifest()["partitions"] if key[:4].isdigit()})
+            spans = [month_bounds(year, month) for year in years]
+            count = sum(totals.count(first, last) for first, last in spans)
 
-            if not filtered:
+            if not count:
                 print(f"No expenses recorded in month: {month_input} ")
                 return
             else:
-                total = sum(float(exp.get("amount", 0)) for exp in filtered)
-                print(f"Total expenses in month {month_input}: {total}")
+                total = sum(totals.total(first, last) for first, last in spans)
+                print(f"Total expenses in month {month_input}: {total:.2f}")
                 return
 
     elif choice == "3":
@@ -439,13 +475,13 @@ def summarize_expenses():
                 print("Invalid year format. Please enter a 4-digit year.")
                 continue
 
-            filtered = [exp for exp in expenses if exp.get("date", "")[:4] == year_input]
+            first, last = year_bounds(int(year_input))
 
-            if not filtered:
+            if not totals.count(first, last):
                 print(f"No expenses recorded in year: {year_input}")
             else:
-                total = sum(exp["amount"] for exp in filtered)
-                print(f"Total expenses in year {year_input}: {total}")
+                total = totals.total(first, last)
+                print(f"Total expenses in year {year_input}: {total:.2f}")
                 return
 
     elif choice == "4":
@@ -463,19 +499,19 @@ def summarize_expenses():
                 print("Invalid month. Please enter a number from 01 to 12.")
                 continue
             month_input = month_input.zfill(2)
-            filtered = [exp for exp in expenses if exp.get("date", "")[:4] == year_input and exp.get("date", "")[5:7] ==  month_input]
+            first, last = month_bounds(int(year_input), int(month_input))
 
-            if not filtered:
+            if not totals.count(first, last):
                 print(f"No expenses found for {month_input}/{year_input}.")
                 return
             else:
-                total = sum(exp["amount"] for exp in filtered)
-                print(f"Total expenses in {month_input}/{year_input}: {total}")
+                total = totals.total(first, last)
+                print(f"Total expenses in {month_input}/{year_input}: {total:.2f}")
                 return
 
     elif choice == "5":
         while True:
-            all_categories = {exp.get("category", "General").lower() for exp in expenses}
+            all_categories = {key for key in totals.amounts if key is not None}
 
             print("Available Categories: ")
             for cat in sorted(all_categories):
@@ -493,24 +529,75 @@ def summarize_expenses():
                 print("Invalid year. Please enter a 4-digit number such 2024.")
                 continue
 
-            filtered = [exp for exp in expenses if exp.get("category", "General").lower() == category_input and exp.get("date", "")[:4] == year_input]
+            first, last = year_bounds(int(year_input))
 
-            if not filtered:
+            if not totals.count(first, last, category_input):
                 print(f"No expenses found under Category '{category_input}' - Year{year_input}.")
             else:
-                total = sum(exp["amount"] for exp in filtered)
-                print(f"Total expenses in category '{category_input}' for year {year_input}: {total}")
+                total = totals.total(first, last, category_input)
+                print(f"Total expenses in category '{category_input}' for year {year_input}: {total:.2f}")
                 return
 
     elif choice == "6":
-        total_count = len(expenses)
-        total_amount = sum(exp["amount"] for exp in expenses)
-        average = total_amount / total_count
+        stats = aggregate_partitions()
 
         print("\nExpense Summary: ")       
-        print(f"Total number of expenses: {total_count}")
-        print(f"Total number spent: {selected_currency}{total_amount:.2f}")
-        print(f"Average expense amount: {selected_currency}{average:.2f}")
+        print(format_stats(stats, selected_currency))
+
+    elif choice == "7":
+        scope = input("Enter a category, a month (YYYY-MM), or leave blank for all: ").strip()
+        quantiles = amount_quantiles()
+        if not scope:
+            result, label = quantiles.summary(), "all expenses"
+        elif len(scope) == 7 and scope[4] == "-":
+            result, label = quantiles.summary(month=scope), f"month {scope}"
+        else:
+            result, label = quantiles.summary(category=scope.title()), f"category '{scope.title()}'"
+
+        if result["median"] is None:
+            print(f"No expenses recorded for {label}.")
+        else:
+            print(f"\nPercentiles for {label} (within 1%):")
+            print(f"Median: {selected_currency}{result['median']:.2f}")
+            print(f"P90: {selected_currency}{result['p90']:.2f}")
+            print(f"P99: {selected_currency}{result['p99']:.2f}")
+
+    elif choice in ("8", "9"):
+        while True:
+            start = valid_date(input("Enter the start date (YYYY-MM-DD): ").strip())
+            end = valid_date(input("Enter the end date (YYYY-MM-DD): ").strip())
+            if start and end:
+                break
+        first, last = sorted((parse_day(start), parse_day(end)))
+        category = input("Enter a category (leave blank for all): ").strip() or None
+
+        if choice == "8":
+            count = totals.count(first, last, category)
+            total = totals.total(first, last, category)
+            print(f"\nSpent between {day_to_str(first)} and {day_to_str(last)}: {selected_currency}{total:.2f} ({count} records)")
+        else:
+            step = 1 if last - first <= 62 else 7
+            print(f"\nRunning balance from {day_to_str(first)} ({'daily' if step == 1 else 'weekly'}):")
+            for day, running in totals.running_totals(first, last, category, step):
+                print(f"  {day_to_str(day)}: {selected_currency}{running:.2f}")
+
+    elif choice == "10":
+        while True:
+            keys = input(f"Group by ({', '.join(GROUP_KEYS)}; space separated): ").lower().split()
+            if keys and all(key in GROUP_KEYS for key in keys):
+                break
+            print("Unknown group key. Please try again.")
+        print()
+        print(format_groups(grouped_summary(keys), keys, selected_currency))
+
+    elif choice == "11":
+        while True:
+            year_input = input("Enter the year (YYYY): ").strip()
+            if year_input.isdigit() and len(year_input) == 4:
+                break
+            print("Invalid year. Please enter a 4-digit year.")
+        print()
+        print(format_pivot(year_pivot(int(year_input)), selected_currency))
     
     input("\nPress Enter to return to the main menu...")
 
@@ -548,7 +635,7 @@ def export_expenses_csv():
 
     try:
         with open(filename, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=["id", "description", "amount", "date", "category"])
+            writer = csv.DictWriter(file, fieldnames=["id", "description", "amount", "date", "category"], extrasaction="ignore")
             writer.writeheader()
             writer.writerows(expenses)
         print(f"Expenses exported successfully to {filename}")
@@ -557,57 +644,31 @@ def export_expenses_csv():
 
 # ------------------- Visuals -------------------
 def visualize_monthlysum():
-    data = load_data()
-    expenses = data.get("expenses", [])
-
-    if not expenses:
+    if not load_manifest()["partitions"]:
         print("No expenses to visualize.")
         return
     year = input("Enter year (YYYY): ").strip()
     month = input("Enter month (01-12): ").strip().zfill(2)
 
-    filtered = [exp for exp in expenses if exp.get("date", "").startswith(f"{year}-{month}")]
+    try:
+        month_bounds(int(year), int(month))
+    except ValueError:
+        print("Invalid year or month.")
+        return
+    category_totals = month_category_totals(int(year), int(month))
 
-    if not filtered:
+    if not category_totals:
         print(f"No expenses for {month}/{year}.")
         return
 
-    category_totals = defaultdict(float)
-    for exp in filtered:
-        category = exp.get("category", "General")
-        category_totals[category] += exp['amount']
-
-    labels = list(category_totals.keys())
-    values = list(category_totals.values())
-
-
-    def make_label(pct, allvals):
-        total = sum(allvals)
-        absolute = int(round(pct/100.*total))
-        return f"{pct: .2f}%\n({selected_currency}{absolute})"
-
-    colors = [
-        "#8B4513",
-        "#C1B18B",
-        "#800020",
-        "#0A1172",
-        "#556B2F",
-        "#DAA520",
-        "#4B0082",
-        "#5D3A00",
-    ]
-    plt.figure(figsize=(8,8))
-    
-    wedges, texts, autotexts = plt.pie(
-        values, labels=None, autopct= lambda pct: make_label(pct, values),
-        startangle=90, colors=colors, textprops=dict(color="black")
-        )
-    plt.legend(wedges, labels, title="Categories", loc="best")
-    
-    plt.title(f"Expense Distribution - {month}/{year}")
-    plt.tight_layout()
-    plt.axis('equal')
-    plt.show()
+    # Saved to a PNG so the menu never waits on a chart window; the GUI
+    # draws the same pie on an embedded canvas (open_summary_window).
+    fig = new_figure(8, 8)
+    draw_category_pie(fig.gca(), category_totals, f"Expense Distribution - {month}/{year}", selected_currency)
+    fig.tight_layout()
+    path = f"expenses_{year}-{month}.png"
+    fig.savefig(path)
+    print(f"Chart saved to {path}")
 
 # ------------------- GUI Functions-------------------
 def submit_expense():
@@ -629,6 +690,12 @@ def submit_expense():
         result_label.configure(text="Amount must be a number!", text_color="red")
         return
 
+    try:
+        parse_day(date)
+    except ValueError:
+        result_label.configure(text="Date must be in YYYY-MM-DD format!", text_color="red")
+        return
+
     add_expense(description, amount, date, category)
     result_label.configure(text="Expense added successfully!", text_color="green")
     result_label.after(3000, lambda: result_label.configure(text=""))
@@ -636,40 +703,75 @@ def submit_expense():
     desc_entry.delete(0, 'end')
     amt_entry.delete(0, 'end')
 
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_MAX_LINES = 1000
+
 def open_search_window():
     search_window = ctk.CTkToplevel()
     search_window.title("Search Expenses")
-    search_window.geometry("700X600")
+    search_window.geometry("700x600")
 
-    ctk.CTkLabel(search_window, text="Enter keyword to search in description:").pack(pady=10)
+    ctk.CTkLabel(search_window, text="Start typing to search descriptions:").pack(pady=10)
     keyword_entry = ctk.CTkEntry(search_window, width=300)
     keyword_entry.pack(pady=5)
 
     result_box = ctk.CTkTextbox(search_window, width=480, height=280)
     result_box.pack(pady=10)
 
+    fuzzy_var = ctk.BooleanVar(value=False)
+    ctk.CTkCheckBox(
+        search_window, text="Fuzzy match (tolerate typos)", variable=fuzzy_var,
+        command=lambda: schedule_search()
+    ).pack(pady=(0, 5))
+
+    searcher = IncrementalSearch()
+    pending_search = [None]
 
     def perform_search():
+        pending_search[0] = None
         keyword = keyword_entry.get().strip().lower()
-        result_box.configure(state="normal")
-        result_box.delete("1.0", "end")
 
         if not keyword:
-            result_box.insert("end", "Please enter a keyword to search.\n")
+            text = "Please enter a keyword to search.\n"
         else:
-            data = load_data()
-            matches = [exp for exp in data["expenses"] if keyword in exp["description"].lower()]
+            if fuzzy_var.get():
+                matches = [exp for _, _, rows in fuzzy_store_index().search(keyword) for exp in rows]
+            else:
+                matches = searcher.search(keyword)
 
             if not matches:
-                result_box.insert("end", "No matching expenses found.\n")
+                text = "No matching expenses found.\n"
             else:
-                for exp in matches:
-                    line = f"ID: {exp['id']} | {exp['date']} | {exp['category']} | {selected_currency}{exp['amount']} | {exp['description']}\n"
-                    result_box.insert("end", line)
-
-        result_box.configure(state="disabled")
-    
-    search_button = ctk.CTkButton(search_window, text="Search", command=perform_search)
+                lines = [
+                    f"ID: {exp['id']} | {exp['date']} | {exp['category']} | {selected_currency}{exp['amount']} | {exp['description']}"
+                    for exp in matches[:SEARCH_MAX_LINES]
+                ]
+                if len(matches) > SEARCH_MAX_LINES:
+                    lines.append(f"... and {len(matches) - SEARCH_MAX_LINES} more, keep typing to narrow down.")
+                text = "\n".join(lines) + "\n"
+
+        with timer("render", "search_results"):
+            result_box.configure(state="normal")
+            result_box.delete("1.0", "end")
+            result_box.insert("end", text)
+            result_box.configure(state="disabled")
+
+    def schedule_search(event=None):
+        if pending_search[0] is not None:
+            search_window.after_cancel(pending_search[0])
+        pending_search[0] = search_window.after(SEARCH_DEBOUNCE_MS, perform_search)
+
+    def search_now():
+        if pending_search[0] is not None:
+            search_window.after_cancel(pending_search[0])
+        perform_search()
+
+    # Warm the prefix index while the user starts typing.
+    search_window.after(50, searcher.index_factory)
+    keyword_entry.bind("<KeyRelease>", schedule_search)
+    keyword_entry.bind("<Return>", lambda event: search_now())
+
+    search_button = ctk.CTkButton(search_window, text="Search", command=search_now)
     search_button.pack()    
 
 def export_to_csv_gui():
@@ -682,7 +784,7 @@ def export_to_csv_gui():
 
     try:
         with open("expenses_export.csv", "w", newline="", encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=["id", "description", "amount", "date", "category"])
+            writer = csv.DictWriter(file, fieldnames=["id", "description", "amount", "date", "category"], extrasaction="ignore")
             writer.writeheader()
             writer.writerows(expenses)
 
@@ -693,71 +795,430 @@ def export_to_csv_gui():
         messagebox.showerror("File Error", f"System error: {e}")
 
 
+# The summary window embeds one Agg-rendered figure in a Tk canvas and
+# redraws it in place for every month. Month totals are computed on a
+# worker thread; the window polls for the result so Tk is only touched
+# from the main thread.
+CHART_POLL_MS = 15
+chart_executor = ThreadPoolExecutor(max_workers=1)
+
 def open_summary_window():
     summary_window = ctk.CTkToplevel()
     summary_window.title("Visualize Monthly Summary")
-    summary_window.geometry("400x250")
+    summary_window.geometry("760x820")
+
+    input_frame = ctk.CTkFrame(summary_window, fg_color="transparent")
+    input_frame.pack(pady=(10, 5))
+
+    ctk.CTkLabel(input_frame, text="Year (YYYY):").pack(side="left", padx=5)
+    year_entry = ctk.CTkEntry(input_frame, width=80)
+    year_entry.pack(side="left")
+
+    ctk.CTkLabel(input_frame, text="Month (1-12):").pack(side="left", padx=5)
+    month_entry = ctk.CTkEntry(input_frame, width=50)
+    month_entry.pack(side="left")
+
+    today = datetime.now()
+    year_entry.insert(0, str(today.year))
+    month_entry.insert(0, str(today.month))
+
+    figure = new_figure(7, 7)
+    axes = figure.add_subplot()
+    canvas = FigureCanvasTkAgg(figure, master=summary_window)
+    canvas.get_tk_widget().pack(fill="both", expand=True, padx=10, pady=10)
+    draw_message(axes, "Pick a month and press Show Chart.")
+    canvas.draw_idle()
+
+    # Only the newest request is drawn when months are flipped quickly.
+    latest = [None]
+
+    def render(period, category_totals):
+        year, month = period
+        with timer("render", "show_chart"):
+            if category_totals:
+                draw_category_pie(axes, category_totals, f"Expenses - {month:02d}/{year}", selected_currency)
+            else:
+                draw_message(axes, f"No expenses found for {year}-{month:02d}.")
+            figure.tight_layout()
+            canvas.draw_idle()
 
-    ctk.CTkLabel(summary_window, text="Enter Year (YYYY):").pack(pady=5)
-    year_entry = ctk.CTkEntry(summary_window, width=200)
-    year_entry.pack()
+    def poll(period, future):
+        if latest[0] is not future or not summary_window.winfo_exists():
+            return
+        if not future.done():
+            summary_window.after(CHART_POLL_MS, poll, period, future)
+            return
+        try:
+            render(period, future.result())
+        except Exception as e:
+            messagebox.showerror("Chart Error", str(e))
 
-    ctk.CTkLabel(summary_window, text="Enter Month (1-12):").pack(pady=5)
-    month_entry = ctk.CTkEntry(summary_window, width=200)
-    month_entry.pack()
+    def load_period(year, month):
+        future = chart_executor.submit(month_category_totals, year, month)
+        latest[0] = future
+        poll((year, month), future)
 
     def show_chart():
         year = year_entry.get().strip()
         month = month_entry.get().strip().zfill(2)
 
-        data = load_data()
-        expenses = data.get("expenses", [])
-        filtered = [exp for exp in expenses if exp.get("date", "").startswith(f"{year}-{month}")]
-        
-        if not filtered:
-            messagebox.showinfo("No Data", f"No expenses found for {year}-{month}.")
-            return   
+        try:
+            month_bounds(int(year), int(month))
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Enter a valid year and month.")
+            return
+        load_period(int(year), int(month))
 
-        category_totals = defaultdict(float)
-        
-        for exp in filtered:
-            category = exp.get("category", "General")
-            category_totals[category] += float(exp["amount"])
-
-        labels = list(category_totals.keys())
-        values = list(category_totals.values())
-
-        def make_label(pct, allvals):
-            total = sum(allvals)
-            absolute = int(round(pct/100.*total))
-            return f"{pct: .2f}%\n({selected_currency}{absolute})"
-
-        colors = [
-            "#8B4513",
-            "#C1B18B",
-            "#800020",
-            "#0A1172",
-            "#556B2F",
-            "#DAA520",
-            "#4B0082",
-            "#5D3A00",
-        ]
-        plt.figure(figsize=(8, 8))
-        wedges, texts, autotexts = plt.pie(
-            values, labels=None,
-            autopct=lambda pct: make_label(pct, values),
-            startangle=90, colors=colors,
-            textprops=dict(color="black")
+    def step_month(delta):
+        try:
+            year, month = int(year_entry.get()), int(month_entry.get())
+            month_bounds(year, month)
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Enter a valid year and month.")
+            return
+        year, month = divmod(year * 12 + month - 1 + delta, 12)
+        month += 1
+        year_entry.delete(0, "end")
+        year_entry.insert(0, str(year))
+        month_entry.delete(0, "end")
+        month_entry.insert(0, str(month))
+        load_period(year, month)
+
+    ctk.CTkButton(input_frame, text="◀", width=40, command=lambda: step_month(-1)).pack(side="left", padx=(15, 5))
+    ctk.CTkButton(input_frame, text="Show Chart", width=100, command=show_chart).pack(side="left")
+    ctk.CTkButton(input_frame, text="▶", width=40, command=lambda: step_month(1)).pack(side="left", padx=5)
+
+    def close():
+        latest[0] = None
+        figure.clear()
+        summary_window.destroy()
+
+    summary_window.protocol("WM_DELETE_WINDOW", close)
+
+# Trend lines come from the Fenwick day buckets on the chart worker, then
+# both series are thinned with LTTB to the canvas width before plotting.
+TREND_RANGES = {"All": None, "Last 10 Years": 3652, "Last 5 Years": 1826, "Last Year": 365, "Last 90 Days": 90}
+TREND_BUCKETS = {"Daily": "day", "Weekly": "week"}
+
+def open_trend_window():
+    span = ledger_span()
+    if span is None:
+        messagebox.showinfo("No Data", "No expenses recorded.")
+        return
+
+    window = ctk.CTkToplevel(app)
+    window.title("Spending Trends")
+    window.geometry("1000x700")
+
+    controls = ctk.CTkFrame(window, fg_color="transparent")
+    controls.pack(fill="x", padx=10, pady=(10, 5))
+    categories = ["All"] + sorted(key.title() for key in daily_totals().amounts if key)
+    range_menu = ctk.CTkOptionMenu(controls, values=list(TREND_RANGES), width=130, command=lambda _: load())
+    bucket_menu = ctk.CTkOptionMenu(controls, values=list(TREND_BUCKETS), width=100, command=lambda _: load())
+    category_menu = ctk.CTkOptionMenu(controls, values=categories, width=140, command=lambda _: load())
+    for label, menu in (("Range:", range_menu), ("Buckets:", bucket_menu), ("Category:", category_menu)):
+        ctk.CTkLabel(controls, text=label).pack(side="left", padx=(10, 5))
+        menu.pack(side="left")
+
+    figure = new_figure(10, 6.5)
+    spend_ax = figure.add_subplot(2, 1, 1)
+    cumulative_ax = figure.add_subplot(2, 1, 2, sharex=spend_ax)
+    canvas = FigureCanvasTkAgg(figure, master=window)
+    canvas.get_tk_widget().pack(fill="both", expand=True, padx=10, pady=10)
+
+    latest = [None]
+
+    def compute(first_day, category, bucket, width):
+        series = trend_series(first_day, span[1], category, bucket)
+        spend = lttb([(day, amount) for day, amount, _ in series], width)
+        cumulative = lttb([(day, running) for day, _, running in series], width)
+        return (
+            [(date.fromordinal(day), value) for day, value in spend],
+            [(date.fromordinal(day), value) for day, value in cumulative],
         )
-        plt.legend(wedges, labels, title="Categories", loc="best")
-        plt.title(f"Expenses - {month}/{year}")
-        plt.axis('equal')
-        plt.tight_layout()
-        plt.show()
 
-    ctk.CTkButton(summary_window, text="Show Chart", command=show_chart).pack(pady=15)
+    def render(title, result):
+        spend, cumulative = result
+        with timer("render", "trend_chart"):
+            if spend:
+                draw_trend(spend_ax, cumulative_ax, spend, cumulative, title, selected_currency)
+            else:
+                draw_message(spend_ax, "No expenses in this range.")
+                cumulative_ax.clear()
+            figure.tight_layout()
+            canvas.draw_idle()
+
+    def poll(title, future):
+        if latest[0] is not future or not window.winfo_exists():
+            return
+        if not future.done():
+            window.after(CHART_POLL_MS, poll, title, future)
+            return
+        try:
+            render(title, future.result())
+        except Exception as e:
+            messagebox.showerror("Chart Error", str(e))
+
+    def load():
+        days = TREND_RANGES[range_menu.get()]
+        first_day = span[0] if days is None else max(span[0], span[1] - days + 1)
+        category = None if category_menu.get() == "All" else category_menu.get()
+        width = max(canvas.get_tk_widget().winfo_width(), 200)
+        title = f"{bucket_menu.get()} Spending - {category_menu.get()} ({range_menu.get()})"
+        future = chart_executor.submit(compute, first_day, category, TREND_BUCKETS[bucket_menu.get()], width)
+        latest[0] = future
+        poll(title, future)
+
+    def close():
+        latest[0] = None
+        figure.clear()
+        window.destroy()
+
+    window.protocol("WM_DELETE_WINDOW", close)
+    window.after(50, load)
+
+# Budget status reads the same running month totals the alerts use, so the
+# panel costs nothing extra to keep current.
+BUDGET_CATEGORIES = ["Home", "Work", "Food", "Entertainment", "Other"]
+
+def parse_budget(text):
+    text = text.strip()
+    if not text:
+        return None
+    value = float(text)
+    if value <= 0:
+        raise ValueError(text)
+    return value
+
+def open_budget_window():
+    window = ctk.CTkToplevel(app)
+    window.title("Budgets")
+    window.geometry("620x460")
+
+    today = datetime.now()
+    ctk.CTkLabel(
+        window, text=f"Monthly Budgets - {today.strftime('%B %Y')}", font=ctk.CTkFont(size=18, weight="bold")
+    ).pack(pady=(10, 5))
+
+    grid = ctk.CTkFrame(window, fg_color="transparent")
+    grid.pack(padx=10, pady=5, fill="x")
+    grid.grid_columnconfigure(2, weight=1)
+    for col, text in enumerate(["Budget", "Amount", "This Month", ""]):
+        ctk.CTkLabel(grid, text=text, font=ctk.CTkFont(weight="bold")).grid(row=0, column=col, padx=6, pady=2, sticky="w")
+
+    saved = user_settings.get("budgets") or {}
+    entries, bars, labels = {}, {}, {}
+    names = ["Overall"] + BUDGET_CATEGORIES
+    for row, name in enumerate(names, start=1):
+        ctk.CTkLabel(grid, text=name).grid(row=row, column=0, padx=6, pady=4, sticky="w")
+        entry = ctk.CTkEntry(grid, width=100, placeholder_text="No budget")
+        amount = saved.get("overall") if name == "Overall" else (saved.get("categories") or {}).get(name)
+        if amount:
+            entry.insert(0, f"{amount:g}")
+        entry.grid(row=row, column=1, padx=6, pady=4)
+        bar = ctk.CTkProgressBar(grid)
+        bar.grid(row=row, column=2, padx=6, pady=4, sticky="ew")
+        label = ctk.CTkLabel(grid, text="", anchor="e", width=160)
+        label.grid(row=row, column=3, padx=6, pady=4, sticky="e")
+        entries[name], bars[name], labels[name] = entry, bar, label
+    normal_color = bars["Overall"].cget("progress_color")
+
+    @timed("render", "budget_status")
+    def render(*_):
+        if not window.winfo_exists():
+            return
+        status = {row["name"]: row for row in budget_status(today.year, today.month)}
+        for name in names:
+            row = status.get(name)
+            if row is None:
+                bars[name].set(0)
+                labels[name].configure(text="-")
+                continue
+            ratio = row["ratio"]
+            bars[name].set(min(ratio, 1.0))
+            bars[name].configure(progress_color="red" if ratio >= 1 else "orange" if ratio >= BUDGET_LEVELS[0] else normal_color)
+            labels[name].configure(text=f"{selected_currency}{row['spent']:.2f} / {selected_currency}{row['budget']:.2f}")
+
+    def save_budgets():
+        try:
+            amounts = {name: parse_budget(entries[name].get()) for name in names}
+        except ValueError:
+            messagebox.showerror("Invalid Budget", "Budgets must be positive numbers (leave blank for none).")
+            return
+        user_settings["budgets"] = {
+            "overall": amounts.pop("Overall"),
+            "categories": {name: amount for name, amount in amounts.items() if amount},
+        }
+        save_settings(user_settings)
+        configure_budgets(user_settings)
+        render()
+
+    ctk.CTkButton(window, text="Save Budgets", command=save_budgets).pack(pady=10)
+
+    def on_change(event, rows):
+        window.after_idle(render)
+
+    subscribe(on_change)
+    window.bind("<Destroy>", lambda event: unsubscribe(on_change) if event.widget is window else None, add="+")
+    render()
 
-def open_update_popup(expense, parent_window):
+# Recurring rules are expanded only for the span on screen; nothing is
+# written to the ledger until an occurrence is due and posted.
+UPCOMING_DAYS = 30
+BILL_DUE_DAYS = 3
+
+def open_recurring_window():
+    window = ctk.CTkToplevel(app)
+    window.title("Recurring Expenses")
+    window.geometry("760x620")
+
+    form = ctk.CTkFrame(window)
+    form.pack(padx=10, pady=10, fill="x")
+    fields = {}
+    for col, (name, width) in enumerate([("Description", 160), ("Amount", 80), ("Start (YYYY-MM-DD)", 110), ("End (optional)", 110)]):
+        ctk.CTkLabel(form, text=name).grid(row=0, column=col, padx=5, sticky="w")
+        fields[name] = ctk.CTkEntry(form, width=width)
+        fields[name].grid(row=1, column=col, padx=5, pady=(0, 5))
+    fields["Start (YYYY-MM-DD)"].insert(0, datetime.now().strftime("%Y-%m-%d"))
+    category_menu = ctk.CTkOptionMenu(form, values=BUDGET_CATEGORIES, width=120)
+    category_menu.grid(row=2, column=0, padx=5, pady=5, sticky="w")
+    frequency_menu = ctk.CTkOptionMenu(form, values=[f.title() for f in FREQUENCIES], width=110)
+    frequency_menu.set("Monthly")
+    frequency_menu.grid(row=2, column=1, padx=5, pady=5, sticky="w")
+
+    rules_frame = ctk.CTkScrollableFrame(window, height=200)
+    rules_frame.pack(padx=10, pady=5, fill="x")
+
+    ctk.CTkLabel(window, text=f"Next {UPCOMING_DAYS} Days", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=12)
+    upcoming_box = ctk.CTkTextbox(window, height=180)
+    upcoming_box.pack(padx=10, pady=5, fill="both", expand=True)
+
+    def render():
+        for widget in rules_frame.winfo_children():
+            widget.destroy()
+        rules = load_rules()["rules"]
+        if not rules:
+            ctk.CTkLabel(rules_frame, text="No recurring expenses yet.").pack(pady=10)
+        for row, rule in enumerate(rules):
+            ends = f" until {rule['end']}" if rule.get("end") else ""
+            text = (f"{rule['description']} | {selected_currency}{rule['amount']:.2f} | {rule['category']}"
+                    f" | {rule['frequency']} from {rule['start']}{ends}")
+            ctk.CTkLabel(rules_frame, text=text, anchor="w").grid(row=row, column=0, padx=5, pady=2, sticky="w")
+            ctk.CTkButton(rules_frame, text="Delete", width=60, fg_color="red",
+                          command=lambda rule_id=rule["id"]: remove(rule_id)).grid(row=row, column=1, padx=5, pady=2)
+
+        start = today()
+        lines = [f"{row['date']} | {row['description']} | {selected_currency}{row['amount']:.2f} | {row['category']}"
+                 for row in expand(start, start + UPCOMING_DAYS - 1, rules)]
+        upcoming_box.configure(state="normal")
+        upcoming_box.delete("1.0", "end")
+        upcoming_box.insert("end", "\n".join(lines) or "Nothing scheduled.")
+        upcoming_box.configure(state="disabled")
+
+    def save_rule():
+        description = fields["Description"].get().strip()
+        start = fields["Start (YYYY-MM-DD)"].get().strip()
+        end = fields["End (optional)"].get().strip() or None
+        try:
+            amount = parse_budget(fields["Amount"].get())
+            parse_day(start)
+            if end:
+                parse_day(end)
+        except ValueError:
+            messagebox.showerror("Invalid Rule", "Enter a positive amount and dates as YYYY-MM-DD.")
+            return
+        if not description or amount is None:
+            messagebox.showerror("Invalid Rule", "Description and Amount are required.")
+            return
+        try:
+            add_rule(description, amount, category_menu.get(), frequency_menu.get().lower(), start, end)
+        except ValueError as e:
+            messagebox.showerror("Invalid Rule", str(e))
+            return
+        fields["Description"].delete(0, "end")
+        fields["Amount"].delete(0, "end")
+        render()
+
+    def remove(rule_id):
+        if messagebox.askyesno("Delete Rule", "Stop this recurring expense? Posted entries are kept."):
+            delete_rule(rule_id)
+            render()
+
+    def post_now():
+        added = post_due()
+        messagebox.showinfo("Recurring Expenses", f"Added {len(added)} due expense(s).")
+        render()
+
+    buttons = ctk.CTkFrame(form, fg_color="transparent")
+    buttons.grid(row=2, column=2, columnspan=2, sticky="e")
+    ctk.CTkButton(buttons, text="Add Rule", width=90, command=save_rule).pack(side="left", padx=5)
+    ctk.CTkButton(buttons, text="Post Due Now", width=110, command=post_now).pack(side="left", padx=5)
+    render()
+
+def check_scheduled():
+    # Startup check: both lookups read the due heap rather than every rule.
+    day = today()
+    if user_settings.get("bill_due_alerts"):
+        soon = [(due, rule) for due, rule in due_items(day + BILL_DUE_DAYS) if due >= day]
+        if soon:
+            messagebox.showinfo("Bills Due", "\n".join(
+                f"{day_to_str(due)}: {rule['description']} ({selected_currency}{rule['amount']:.2f})" for due, rule in soon
+            ))
+    if user_settings.get("expense_reminders"):
+        due = due_items(day)
+        if due and messagebox.askyesno(
+            "Add Expense Reminder", f"{len(due)} recurring expense(s) are due. Add them to your expenses now?"
+        ):
+            post_due(day)
+
+def open_pivot_window():
+    years = sorted({key[:4] for key in load_manifest()["partitions"] if key[:4].isdigit()}, reverse=True)
+    if not years:
+        messagebox.showinfo("No Data", "No expenses recorded.")
+        return
+
+    window = ctk.CTkToplevel(app)
+    window.title("Category x Month")
+    window.geometry("1000x420")
+
+    top_frame = ctk.CTkFrame(window, fg_color="transparent")
+    top_frame.pack(fill="x", padx=10, pady=(10, 5))
+    ctk.CTkLabel(top_frame, text="Spending by Category and Month", font=ctk.CTkFont(size=18, weight="bold")).pack(side="left")
+    year_menu = ctk.CTkOptionMenu(top_frame, values=years, width=100, command=lambda year: render(int(year)))
+    year_menu.pack(side="right")
+
+    table_frame = ctk.CTkScrollableFrame(window, orientation="horizontal", width=960, height=320)
+    table_frame.pack(padx=10, pady=10, fill="both", expand=True)
+    bold = ctk.CTkFont(weight="bold")
+
+    @timed("render", "pivot_table")
+    def render(year):
+        for widget in table_frame.winfo_children():
+            widget.destroy()
+        pivot = year_pivot(year)
+        header = ["Category"] + [datetime.strptime(month, "%Y-%m").strftime("%b") for month in pivot["months"]] + ["Total"]
+        for col, text in enumerate(header):
+            ctk.CTkLabel(table_frame, text=text, font=bold).grid(row=0, column=col, padx=6, pady=2, sticky="e")
+
+        body = list(zip(pivot["categories"], pivot["cells"], pivot["row_totals"]))
+        body.append(("Total", pivot["column_totals"], pivot["total"]))
+        for row, (category, cells, total) in enumerate(body, start=1):
+            font = bold if category == "Total" else None
+            ctk.CTkLabel(table_frame, text=category, font=font, anchor="w").grid(row=row, column=0, padx=6, pady=2, sticky="w")
+            for col, value in enumerate(cells, start=1):
+                ctk.CTkLabel(table_frame, text=f"{value:.0f}" if value else "-", font=font).grid(row=row, column=col, padx=6, pady=2, sticky="e")
+            ctk.CTkLabel(table_frame, text=f"{selected_currency}{total:.2f}", font=bold).grid(row=row, column=len(cells) + 1, padx=6, pady=2, sticky="e")
+
+    render(int(years[0]))
+
+def sync_calendar(cal, date_text):
+    # A reused calendar opens on the date already typed, if it is valid.
+    try:
+        cal.selection_set(datetime.strptime(date_text.strip(), "%Y-%m-%d").date())
+    except ValueError:
+        pass
+
+def open_update_popup(expense):
     popup = ctk.CTkToplevel()
     popup.title("Update Expense")
     popup.geometry("450x450")
@@ -765,22 +1226,23 @@ def open_update_popup(expense, parent_window):
     calendar_widget = [None]
 
     def toggle_calendar():
-        if calendar_widget[0]:
-            calendar_widget[0].destroy()
-            calendar_widget[0] = None
-        else:
-            cal = Calendar(content_frame, selectmode='day', date_pattern='yyyy-mm-dd', showweeknumbers=False)
-            cal.grid(row=4, column=1, columnspan=2, pady=(5, 10))
-            calendar_widget[0] = cal
+        # Built once per popup, then only shown and hidden.
+        cal = calendar_widget[0]
+        if cal is None:
+            cal = calendar_widget[0] = Calendar(content_frame, selectmode='day', date_pattern='yyyy-mm-dd', showweeknumbers=False)
 
             def on_select(event=None):
                 selected_date = cal.get_date()
-                date_entry.delete(0, "end")
-                date_entry.insert(0, selected_date)
-                cal.destroy()
-                calendar_widget[0] = None
+                update_date_entry.delete(0, "end")
+                update_date_entry.insert(0, selected_date)
+                cal.grid_remove()
 
             cal.bind("<<CalendarSelected>>", on_select)
+        elif cal.winfo_ismapped():
+            cal.grid_remove()
+            return
+        sync_calendar(cal, update_date_entry.get())
+        cal.grid(row=4, column=1, columnspan=2, pady=(5, 10))
 
     content_frame = ctk.CTkFrame(popup)
     content_frame.pack(pady=30)
@@ -814,7 +1276,7 @@ def open_update_popup(expense, parent_window):
     # --- Category ---
     ctk.CTkLabel(content_frame, text="Category:").grid(row=5, column=0, sticky="e", padx=10, pady=5)
     category_option = ctk.CTkOptionMenu(content_frame, values=["Home", "Work", "Food", "Entertainment", "Other"])
-    category_option.set(expense.get("category", "Other"))
+    category_option.set(expense["category"])
     category_option.grid(row=4, column=1, padx=10, pady=5, sticky="w")
 
     # --- Result Label ---
@@ -841,29 +1303,25 @@ def open_update_popup(expense, parent_window):
             return
 
         try:
-            datetime.strptime(new_date, "%Y-%m-%d")
+            parse_day(new_date)
         except ValueError:
             result_label.configure(text="Invalid date format.")
             return
 
-        data = load_data()
-        for exp in data["expenses"]:
-            if exp["id"] == expense["id"]:
-                exp["description"] = new_desc
-                exp["amount"] = new_amt
-                exp["date"] = new_date
-                exp["category"] = new_category
-                break
-
-        save_data(data)
+        changes = {"description": new_desc, "amount": new_amt, "date": new_date, "category": new_category}
+        changes = {field: value for field, value in changes.items() if value != expense.get(field)}
+        try:
+            retry(lambda: update_record(expense, changes))
+        except (ConflictError, TimeoutError) as e:
+            result_label.configure(text=str(e))
+            return
         messagebox.showinfo("Success", "Expense updated successfully!")
         popup.destroy()
-        parent_window.destroy()
-        modify_expenses_gui()
 
     save_btn = ctk.CTkButton(content_frame, text="Save Changes", command=save_changes)
     save_btn.grid(row=6, column=0, columnspan=2, pady=15)
 
+@timed("render")
 def modify_expenses_gui():
     data = load_data()
     expenses = data.get("expenses", [])
@@ -874,30 +1332,90 @@ def modify_expenses_gui():
 
     modify_window = ctk.CTkToplevel()
     modify_window.title("Modify Expenses")
-    modify_window.geometry("800x550")
+    modify_window.geometry("840x600")
+
+    # --- Bulk actions on the checked rows ---
+    selection = {}
+
+    def selected_rows():
+        return [exp for var, exp in selection.values() if var.get()]
+
+    def update_selection_label(*_):
+        selection_label.configure(text=f"{len(selected_rows())} selected")
+
+    def toggle_all():
+        for var, _ in selection.values():
+            var.set(select_all_var.get())
+        update_selection_label()
+
+    def bulk_delete():
+        rows = selected_rows()
+        if not rows:
+            messagebox.showinfo("Nothing Selected", "Tick the expenses to delete first.")
+            return
+        if not messagebox.askyesno("Confirm Deletion", f"Delete {len(rows)} selected expenses?"):
+            return
+        try:
+            deleted = retry(lambda: delete_many([exp["id"] for exp in rows], rows))
+        except (ConflictError, TimeoutError) as e:
+            messagebox.showerror("Delete Failed", str(e))
+            return
+        messagebox.showinfo("Deleted", f"{len(deleted)} expenses deleted.")
 
-    scroll_frame = ctk.CTkScrollableFrame(modify_window, width=780, height=500)
+    def bulk_recategorize():
+        category = recategorize_menu.get()
+        edits = [(exp, {"category": category}) for exp in selected_rows() if exp["category"] != category]
+        if not edits:
+            messagebox.showinfo("Nothing to Change", f"No selected expenses outside '{category}'.")
+            return
+        try:
+            retry(lambda: update_many(edits))
+        except (ConflictError, TimeoutError) as e:
+            messagebox.showerror("Update Failed", str(e))
+            return
+        messagebox.showinfo("Updated", f"{len(edits)} expenses moved to '{category}'.")
+
+    bulk_frame = ctk.CTkFrame(modify_window, fg_color="transparent")
+    bulk_frame.pack(fill="x", padx=10, pady=(10, 0))
+
+    select_all_var = ctk.BooleanVar(value=False)
+    ctk.CTkCheckBox(bulk_frame, text="Select All", variable=select_all_var, command=toggle_all).pack(side="left", padx=5)
+    selection_label = ctk.CTkLabel(bulk_frame, text="0 selected")
+    selection_label.pack(side="left", padx=10)
+
+    ctk.CTkButton(bulk_frame, text="Apply", width=70, command=bulk_recategorize).pack(side="right", padx=5)
+    recategorize_menu = ctk.CTkOptionMenu(bulk_frame, values=["Home", "Work", "Food", "Entertainment", "Other"], width=130)
+    recategorize_menu.pack(side="right", padx=5)
+    ctk.CTkLabel(bulk_frame, text="Move selected to:").pack(side="right", padx=5)
+    ctk.CTkButton(bulk_frame, text="🗑️ Delete Selected", fg_color="#a51f1f", command=bulk_delete).pack(side="right", padx=15)
+
+    scroll_frame = ctk.CTkScrollableFrame(modify_window, width=820, height=500)
     scroll_frame.pack(pady=10)
 
-    headers = ["ID", "Date", "Category", "Amount", "Description"]
+    headers = ["", "ID", "Date", "Category", "Amount", "Description"]
     for col, header in enumerate(headers):
         label = ctk.CTkLabel(scroll_frame, text=header, font=ctk.CTkFont(weight="bold"))
         label.grid(row=0, column=col, padx=5, pady=5)
 
     label = ctk.CTkLabel(scroll_frame, text="Actions", font=ctk.CTkFont(weight="bold"))
-    label.grid(row=0, column=5, columnspan=2, padx=5, pady=5)
+    label.grid(row=0, column=6, columnspan=2, padx=5, pady=5)
 
-    def confirm_delete(exid):
+    def confirm_delete(exp):
         confirm = messagebox.askyesno("Confirm Deletion", "Are you sure you want to delete this expense?")
         if confirm:
-            delete_expense_by_id(exid, modify_window)
-
-    for row, exp in enumerate(expenses, start=1):
-        ctk.CTkLabel(scroll_frame, text=str(exp["id"])).grid(row=row, column=0, padx=5, pady=2)
-        ctk.CTkLabel(scroll_frame, text=exp["date"]).grid(row=row, column=1, padx=5, pady=2)
-        ctk.CTkLabel(scroll_frame, text=exp["category"]).grid(row=row, column=2, padx=5, pady=2)
-        ctk.CTkLabel(scroll_frame, text=f"{selected_currency}{exp['amount']}").grid(row=row, column=3, padx=5, pady=2)
-        ctk.CTkLabel(scroll_frame, text=exp["description"]).grid(row=row, column=4, padx=5, pady=2)
+            delete_expense_by_id(exp["id"], exp)
+
+    def render_row(exp, row):
+        # An edited row keeps its checkbox state.
+        var = selection[exp["id"]][0] if exp["id"] in selection else ctk.BooleanVar(value=False)
+        selection[exp["id"]] = (var, exp)
+        widgets = [ctk.CTkCheckBox(scroll_frame, text="", width=24, variable=var, command=update_selection_label)]
+        widgets[0].grid(row=row, column=0, padx=(5, 0), pady=2)
+        texts = [str(exp["id"]), exp["date"], exp["category"], f"{selected_currency}{exp['amount']}", exp["description"]]
+        for col, text in enumerate(texts, start=1):
+            label = ctk.CTkLabel(scroll_frame, text=text)
+            label.grid(row=row, column=col, padx=5, pady=2)
+            widgets.append(label)
 
         delete_btn = ctk.CTkButton(
             scroll_frame,
@@ -905,9 +1423,9 @@ def modify_expenses_gui():
             width=40,
             fg_color="transparent",
             text_color="red",
-            command=lambda exid=exp["id"]: confirm_delete(exid)
+            command=lambda ex=exp: confirm_delete(ex)
         )
-        delete_btn.grid(row=row, column=5, padx=5, sticky="e")
+        delete_btn.grid(row=row, column=6, padx=5, sticky="e")
 
         update_btn = ctk.CTkButton(
             scroll_frame,
@@ -915,9 +1433,16 @@ def modify_expenses_gui():
             width=40,
             fg_color="transparent",
             text_color="green",
-            command=lambda ex=exp: open_update_popup(ex, modify_window)
+            command=lambda ex=exp: open_update_popup(ex)
         )
-        update_btn.grid(row=row, column=6, padx=(5, 5), sticky="w")
+        update_btn.grid(row=row, column=7, padx=(5, 5), sticky="w")
+        return widgets + [delete_btn, update_btn]
+
+    def forget_row(exp_id):
+        selection.pop(exp_id, None)
+        update_selection_label()
+
+    live_rows(modify_window, expenses, render_row, on_remove=forget_row)
 
 # ------------------- Main GUI-------------------
 
@@ -925,6 +1450,11 @@ def modify_expenses_gui():
 user_settings = load_settings()
 ctk.set_appearance_mode(user_settings.get("theme", "System"))
 default_currency = user_settings.get("currency", "₹")
+query_cache.configure(
+    max_entries=user_settings.get("cache_max_entries"),
+    max_bytes=user_settings.get("cache_max_mb", 32) * 1024 * 1024,
+)
+configure_budgets(user_settings)
 
 ctk.set_default_color_theme("blue")
 
@@ -934,6 +1464,14 @@ app.geometry("1000x620")
 
 calendar_widget_home = [None]
 
+def show_budget_alerts(alerts):
+    if user_settings.get("budget_alerts", True):
+        messagebox.showwarning("Budget Alert", "\n".join(alerts))
+
+subscribe_alerts(show_budget_alerts)
+# Loading this month's counters up front keeps every add's check O(1).
+watch_month(datetime.now().year, datetime.now().month)
+
 #---------------Shrink Based on Window Width---------------
 stat_title_labels = []
 stat_value_labels = []
@@ -973,35 +1511,28 @@ ctk.CTkLabel(
 card_row = ctk.CTkFrame(scrollable_dashboard, fg_color="transparent")
 card_row.pack(fill="both", expand=True)
 
-from collections import Counter
-data = load_data()
-expenses = data.get("expenses", [])
-
 # ---- Dashboard Metrics ----
-total_spent = sum(exp["amount"] for exp in expenses)
-total_entries = len(expenses)
-categories = set(exp.get("category", "General") for exp in expenses)
-total_categories = len(categories)
-avg_expense = total_spent / total_entries if total_entries > 0 else 0
-
-category_counts = Counter(exp.get("category", "General") for exp in expenses)
-top_category = category_counts.most_common(1)[0][0] if category_counts else "N/A"
-
-highest_expense = max((exp["amount"] for exp in expenses), default=0)
-highest_expense_entry = next((exp for exp in expenses if exp["amount"] == highest_expense), None)
-costliest_day = highest_expense_entry.get("date") if highest_expense_entry else "N/A"
-
-least_used_category = (
-    min(category_counts.items(), key=lambda x: x[1])[0] if category_counts else "N/A"
+# Large ledgers answer the cards from the sketches alone; only the exact
+# dashboard needs every row in memory.
+approximate_dashboard = use_approximate(user_settings.get("dashboard_mode", "auto"))
+expenses = None if approximate_dashboard else load_data()["expenses"]
+metrics = dashboard_metrics(
+    expenses,
+    group_descriptions=group_similar_descriptions,
+    sketches=usage_sketches() if approximate_dashboard else None,
 )
-
-lowest_expense = min((exp["amount"] for exp in expenses), default=0)
-
-date_counts = Counter(exp.get("date", "Unknown") for exp in expenses)
-most_active_day = date_counts.most_common(1)[0] if date_counts else ("N/A", 0)
-
-desc_counts = Counter(exp.get("description", "").strip().lower() for exp in expenses)
-recurring_desc = desc_counts.most_common(1)[0][0].title() if desc_counts else "N/A"
+total_spent = metrics["total_spent"]
+total_entries = metrics["total_entries"]
+total_categories = metrics["total_categories"]
+avg_expense = metrics["avg_expense"]
+top_category = metrics["top_category"]
+highest_expense = metrics["highest_expense"]
+costliest_day = metrics["costliest_day"]
+least_used_category = metrics["least_used_category"]
+lowest_expense = metrics["lowest_expense"]
+most_active_day = metrics["most_active_day"]
+recurring_desc = metrics["recurring_desc"]
+amount_percentiles = amount_quantiles().summary()
 
 # -------- All Dashboard Cards --------
 cards = [
@@ -1009,6 +1540,9 @@ cards = [
     ("Categories", str(total_categories)),
     ("Entries", str(total_entries)),
     ("Avg", f"{avg_expense:.2f}"),
+    ("Median", f"{amount_percentiles['median'] or 0:.2f}"),
+    ("P90", f"{amount_percentiles['p90'] or 0:.2f}"),
+    ("P99", f"{amount_percentiles['p99'] or 0:.2f}"),
     ("Top Category", top_category),
     ("Highest Expense", f"{highest_expense:.2f}"),
     ("Costliest Day", costliest_day),
@@ -1017,7 +1551,7 @@ cards = [
     ("Most Active Day", f"{most_active_day[0]} ({most_active_day[1]} records)"),
     ("Recurring Entry", recurring_desc)
 ]
-money_titles = {"Total", "Avg", "Highest Expense","Costliest Day", "Lowest Expense"}
+money_titles = {"Total", "Avg", "Median", "P90", "P99", "Highest Expense","Costliest Day", "Lowest Expense"}
 
 def create_stat_card(parent, title, value):
     card = ctk.CTkFrame(parent, width=220, height=80, corner_radius=10, fg_color="transparent")
@@ -1047,26 +1581,54 @@ def create_stat_card(parent, title, value):
 for title, value in cards:
     create_stat_card(card_row, title, value)
 
-total = sum(exp["amount"] for exp in expenses)
 total_label = ctk.CTkLabel(
     scrollable_dashboard,
-    text=f"Total: {selected_currency}{total:.2f}",
+    text=f"Total: {selected_currency}{total_spent:.2f}",
     font=ctk.CTkFont(size=16, weight="bold")
 )
 total_label.pack(pady=(10, 0))
 
-def scale_fonts(event):
-    new_width = event.width
-    scale_factor = new_width / 1000 
+# <Configure> reaches the app for every child widget and every pixel of a
+# drag. Only the window's own width changes count; they are coalesced into
+# one rescale per FONT_SCALE_DELAY_MS, fonts are shared per size, and the
+# labels are only touched when a computed size actually changes.
+FONT_SCALE_DELAY_MS = 80
+font_cache = {}
+pending_font_scale = [None]
+last_app_width = [None]
+current_font_sizes = [None]
+
+def shared_font(size, weight="normal"):
+    key = (size, weight)
+    if key not in font_cache:
+        font_cache[key] = ctk.CTkFont(size=size, weight=weight)
+    return font_cache[key]
+
+def apply_font_scale():
+    pending_font_scale[0] = None
+    scale_factor = last_app_width[0] / 1000
 
     new_title_size = max(10, int(13 * scale_factor))
     new_value_size = max(12, int(18 * scale_factor))
+    if current_font_sizes[0] == (new_title_size, new_value_size):
+        return
+    current_font_sizes[0] = (new_title_size, new_value_size)
+
+    with timer("render", "scale_fonts"):
+        title_font = shared_font(new_title_size)
+        value_font = shared_font(new_value_size, "bold")
+        for label in stat_title_labels:
+            label.configure(font=title_font)
 
-    for label in stat_title_labels:
-        label.configure(font=ctk.CTkFont(size=new_title_size))
+        for label in stat_value_labels:
+            label.configure(font=value_font)
 
-    for label in stat_value_labels:
-        label.configure(font=ctk.CTkFont(size=new_value_size, weight="bold"))
+def scale_fonts(event):
+    if event.widget is not app or event.width == last_app_width[0]:
+        return
+    last_app_width[0] = event.width
+    if pending_font_scale[0] is None:
+        pending_font_scale[0] = app.after(FONT_SCALE_DELAY_MS, apply_font_scale)
 
 app.bind("<Configure>", scale_fonts)
 
@@ -1115,8 +1677,7 @@ def settings_window():
             value_label.configure(text=f"{selected_currency}{number}")
 
         if 'total_label' in globals():
-            total = sum(exp["amount"] for exp in expenses)
-            total_label.configure(text=f"Total: {selected_currency}{total:.2f}")
+            total_label.configure(text=f"Total: {selected_currency}{total_spent:.2f}")
 
     title_label = ctk.CTkLabel(settings_win, text="Settings", font=("Helvetica", 22, "bold"))
     title_label.pack(pady=10)
@@ -1130,6 +1691,7 @@ def settings_window():
     expense_tab = tabs.add("Expense Behavior")
     notifications_tab = tabs.add("Notifications")
     danger_tab = tabs.add("System Actions")
+    performance_tab = tabs.add("Performance")
 
     # ========== GENERAL SETTINGS ==========
     ctk.CTkLabel(general_tab, text="Theme Mode").pack(anchor="w", padx=10, pady=(10, 0))
@@ -1158,23 +1720,103 @@ def settings_window():
     ).pack(padx=10, pady=5)
 
     # ========== EXPENSE BEHAVIOR ==========
+    def on_threshold_change(event=None):
+        try:
+            threshold = parse_budget(threshold_entry.get())
+        except ValueError:
+            messagebox.showerror("Invalid Threshold", "The alert threshold must be a positive number.")
+            return
+        if threshold != user_settings.get("alert_threshold"):
+            user_settings["alert_threshold"] = threshold
+            save_settings(user_settings)
+            configure_budgets(user_settings)
+
     ctk.CTkLabel(expense_tab, text="Expense Alert Threshold").pack(anchor="w", padx=10, pady=(10, 0))
-    ctk.CTkEntry(expense_tab, placeholder_text="e.g. 1000").pack(padx=10, pady=5)
+    threshold_entry = ctk.CTkEntry(expense_tab, placeholder_text="e.g. 1000")
+    if user_settings.get("alert_threshold"):
+        threshold_entry.insert(0, f"{user_settings['alert_threshold']:g}")
+    threshold_entry.pack(padx=10, pady=5)
+    threshold_entry.bind("<Return>", on_threshold_change)
+    threshold_entry.bind("<FocusOut>", on_threshold_change)
+    ctk.CTkButton(expense_tab, text="Monthly Budgets...", command=open_budget_window).pack(padx=10, pady=5)
 
     ctk.CTkLabel(expense_tab, text="Default Category").pack(anchor="w", padx=10, pady=(10, 0))
     ctk.CTkOptionMenu(expense_tab, values=["Food", "Travel", "Bills", "Other"]).pack(padx=10, pady=5)
 
     # ========== NOTIFICATIONS ==========
     ctk.CTkCheckBox(notifications_tab, text="Daily Summary").pack(anchor="w", padx=10, pady=5)
-    ctk.CTkCheckBox(notifications_tab, text="Add Expense Reminder").pack(anchor="w", padx=10, pady=5)
-    ctk.CTkCheckBox(notifications_tab, text="Bill Due Alerts").pack(anchor="w", padx=10, pady=5)
+    def notification_toggle(key, var):
+        user_settings[key] = var.get()
+        save_settings(user_settings)
+
+    for text, key in (("Add Expense Reminder", "expense_reminders"), ("Bill Due Alerts", "bill_due_alerts")):
+        var = ctk.BooleanVar(value=user_settings.get(key, False))
+        ctk.CTkCheckBox(
+            notifications_tab, text=text, variable=var, command=lambda key=key, var=var: notification_toggle(key, var)
+        ).pack(anchor="w", padx=10, pady=5)
+
+    def on_budget_alerts_toggle():
+        user_settings["budget_alerts"] = budget_alerts_var.get()
+        save_settings(user_settings)
+
+    budget_alerts_var = ctk.BooleanVar(value=user_settings.get("budget_alerts", True))
+    ctk.CTkCheckBox(
+        notifications_tab, text="Budget Alerts", variable=budget_alerts_var, command=on_budget_alerts_toggle
+    ).pack(anchor="w", padx=10, pady=5)
 
     # ========== SYSTEM ACTIONS ==========
     ctk.CTkButton(danger_tab, text="Clear All Expense Data", fg_color="red").pack(pady=5)
     ctk.CTkButton(danger_tab, text="Reset All Settings", fg_color="red").pack(pady=5)
     ctk.CTkButton(danger_tab, text="Export All Data").pack(pady=5)
+
+    def check_data():
+        report = validation_report()
+        if not report["shards"]:
+            messagebox.showinfo("Data Check", format_report(report))
+            return
+        if messagebox.askyesno("Data Check", format_report(report) + "\n\nWrite the repairs and move rejected rows to quarantine.json?"):
+            repair_ledger()
+            messagebox.showinfo("Data Check", "Repairs saved.")
+
+    ctk.CTkButton(danger_tab, text="Check & Repair Data", command=check_data).pack(pady=5)
     ctk.CTkLabel(danger_tab, text="Warning: These actions are irreversible!", text_color="red").pack(padx=10, pady=10)
 
+    # ========== PERFORMANCE ==========
+    def refresh_timings():
+        cache_stats = query_cache.stats()
+        timings_box.configure(state="normal")
+        timings_box.delete("1.0", "end")
+        timings_box.insert(
+            "end",
+            f"Query cache: {cache_stats['entries']} entries, {cache_stats['bytes'] / 1024:.0f} KiB"
+            f" / {cache_stats['max_bytes'] / 1024 / 1024:.0f} MiB, {cache_stats['hits']} hits,"
+            f" {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%})\n\n"
+        )
+        timings_box.insert("end", perf.format_report())
+        timings_box.configure(state="disabled")
+
+    def on_profile_toggle():
+        perf.set_enabled(profile_var.get())
+        refresh_timings()
+
+    def on_reset_timings():
+        perf.reset()
+        refresh_timings()
+
+    profile_var = ctk.BooleanVar(value=perf.ENABLED)
+    ctk.CTkCheckBox(
+        performance_tab, text="Record timings", variable=profile_var, command=on_profile_toggle
+    ).pack(anchor="w", padx=10, pady=5)
+
+    timings_box = ctk.CTkTextbox(performance_tab, width=440, height=280, font=("Courier", 11))
+    timings_box.pack(padx=10, pady=5, fill="both", expand=True)
+
+    perf_buttons = ctk.CTkFrame(performance_tab, fg_color="transparent")
+    perf_buttons.pack(pady=5)
+    ctk.CTkButton(perf_buttons, text="Refresh", command=refresh_timings, width=100).pack(side="left", padx=5)
+    ctk.CTkButton(perf_buttons, text="Reset", command=on_reset_timings, width=100).pack(side="left", padx=5)
+    refresh_timings()
+
 settings_btn = ctk.CTkButton(
     top_bar, text="Settings", command=settings_window, width=130
 )   
@@ -1207,10 +1849,9 @@ date_entry.pack(side="left", padx=(0, 5))
 calendar_widget_home = [None]
 
 def toggle_calendar_home():
-    if calendar_widget_home[0]:
-        calendar_widget_home[0].destroy()
-        calendar_widget_home[0] = None
-    else:
+    # The calendar is built on first use and afterwards only shown/hidden.
+    cal = calendar_widget_home[0]
+    if cal is None:
         cal = Calendar(
             master=form_frame,
             selectmode='day',
@@ -1219,16 +1860,18 @@ def toggle_calendar_home():
         )
         calendar_widget_home[0] = cal
 
-        cal.place(x=320, y=140)
-
         def on_select(event=None):
             selected_date = cal.get_date()
             date_entry.delete(0, "end")
             date_entry.insert(0, selected_date)
-            cal.destroy()
-            calendar_widget_home[0] = None
+            cal.place_forget()
 
         cal.bind("<<CalendarSelected>>", on_select)
+    elif cal.winfo_ismapped():
+        cal.place_forget()
+        return
+    sync_calendar(cal, date_entry.get())
+    cal.place(x=320, y=140)
 
 ctk.CTkButton(date_frame, text="📅", width=40, command=toggle_calendar_home).pack(side="left")
 
@@ -1384,11 +2027,85 @@ def open_amount_filter_menu():
 
     ctk.CTkButton(popup, text="Apply Filter", command=apply_amount_filter).pack(pady=10)
 
+def open_combined_filter():
+    popup = ctk.CTkToplevel(app)
+    popup.title("Combined Filter")
+    popup.geometry("360x460")
+
+    ctk.CTkLabel(popup, text="Stack any of these conditions:", font=ctk.CTkFont(size=15, weight="bold")).pack(pady=(10, 5))
+
+    ctk.CTkLabel(popup, text="Category").pack()
+    category_menu = ctk.CTkOptionMenu(popup, values=["Any", "Home", "Work", "Food", "Entertainment", "Other"])
+    category_menu.pack(pady=(0, 5))
+
+    period_frame = ctk.CTkFrame(popup, fg_color="transparent")
+    period_frame.pack(pady=5)
+    ctk.CTkLabel(period_frame, text="Month / Year").pack()
+    month_menu = ctk.CTkOptionMenu(period_frame, values=["Any"] + [str(m).zfill(2) for m in range(1, 13)], width=100)
+    month_menu.pack(side="left", padx=5)
+    year_menu = ctk.CTkOptionMenu(period_frame, values=["Any"] + [str(y) for y in range(2020, datetime.now().year + 2)], width=100)
+    year_menu.pack(side="left", padx=5)
+
+    ctk.CTkLabel(popup, text=f"Amount range ({selected_currency})").pack(pady=(5, 0))
+    amount_frame = ctk.CTkFrame(popup, fg_color="transparent")
+    amount_frame.pack(pady=5)
+    min_entry = ctk.CTkEntry(amount_frame, width=100, placeholder_text="Min")
+    min_entry.pack(side="left", padx=5)
+    max_entry = ctk.CTkEntry(amount_frame, width=100, placeholder_text="Max")
+    max_entry.pack(side="left", padx=5)
+
+    ctk.CTkLabel(popup, text="Description contains").pack(pady=(5, 0))
+    keyword_entry = ctk.CTkEntry(popup, width=220)
+    keyword_entry.pack(pady=5)
+
+    error_label = ctk.CTkLabel(popup, text="", text_color="red")
+    error_label.pack()
+
+    def apply_combined_filter():
+        query = Query()
+        if category_menu.get() != "Any":
+            query = query.where_category(category_menu.get())
+
+        month, year = month_menu.get(), year_menu.get()
+        if month != "Any" and year == "Any":
+            error_label.configure(text="Pick a year to filter by month.")
+            return
+        if year != "Any":
+            if month != "Any":
+                query = query.in_month(int(year), int(month))
+            else:
+                query = query.between_days(*year_bounds(int(year)))
+
+        try:
+            min_amt = float(min_entry.get()) if min_entry.get().strip() else None
+            max_amt = float(max_entry.get()) if max_entry.get().strip() else None
+        except ValueError:
+            error_label.configure(text="Amounts must be numbers.")
+            return
+        if min_amt is not None and max_amt is not None and min_amt > max_amt:
+            min_amt, max_amt = max_amt, min_amt
+        if min_amt is not None:
+            query = query.amount_at_least(min_amt)
+        if max_amt is not None:
+            query = query.amount_at_most(max_amt)
+
+        query = query.matching(keyword_entry.get())
+        popup.destroy()
+
+        filtered = query.run()
+        if not filtered:
+            messagebox.showinfo("No Results", f"No expenses for {query.describe()}")
+        else:
+            show_filtered_expenses(filtered)
+
+    ctk.CTkButton(popup, text="Apply Filter", command=apply_combined_filter).pack(pady=10)
+
 options = [
     ("Filter by Category", lambda: open_filter_by_category()),
     ("Filter by Date", lambda: open_filter_by_date()),
     ("Filter by Month & Year", lambda: open_filter_by_month_year()),
-    ("Filter by Amount", lambda: open_amount_filter_menu())
+    ("Filter by Amount", lambda: open_amount_filter_menu()),
+    ("Combined Filter", lambda: open_combined_filter())
 ]
 
 fg_color = "#dcdcdc" 
@@ -1408,6 +2125,7 @@ filter_btn.bind("<Leave>", hide_filter_menu_delayed)
 filter_menu_popup.bind("<Enter>", show_filter_menu)
 filter_menu_popup.bind("<Leave>", hide_filter_menu_delayed)
 
+@timed("render")
 def show_filtered_expenses(filtered):
     if not filtered:
         messagebox.showinfo("No Results", "No expenses found for the selected filter.")
@@ -1427,7 +2145,7 @@ def show_filtered_expenses(filtered):
             timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
             filename = os.path.join(export_folder, f"filtered_export_{timestamp}.csv")
             with open(filename, "w", newline="", encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=["id", "description", "amount", "date", "category"])
+                writer = csv.DictWriter(f, fieldnames=["id", "description", "amount", "date", "category"], extrasaction="ignore")
                 writer.writeheader()
                 writer.writerows(filtered_data)
             messagebox.showinfo("Success", f"Exported to '{filename}'")
@@ -1462,10 +2180,7 @@ def show_filtered_expenses(filtered):
         ctk.CTkLabel(list_frame, text=text, anchor="w").pack(fill="x", padx=10, pady=2)
 
 def filter_by_category(selected_category):
-    data = load_data()
-    expenses = data.get("expenses", [])
-
-    filtered = [exp for exp in expenses if exp.get("category") == selected_category]
+    filtered = Query().where_category(selected_category).run()
 
     if not filtered:
         messagebox.showinfo("No Results", f"No expenses found in category: {selected_category}")
@@ -1473,10 +2188,7 @@ def filter_by_category(selected_category):
         show_filtered_expenses(filtered)
 
 def filter_by_date(selected_date):
-    data = load_data()
-    expenses = data.get("expenses", [])
-
-    filtered = [exp for exp in expenses if exp.get("date") == selected_date]
+    filtered = Query().on(selected_date).run()
 
     if not filtered:
         messagebox.showinfo("No results", f"No expenses on: {selected_date}")
@@ -1484,13 +2196,7 @@ def filter_by_date(selected_date):
         show_filtered_expenses(filtered)
 
 def filter_by_month_year(month, year):
-    data = load_data()
-    expenses = data.get("expenses", [])
-
-    filtered = [
-        exp for exp in expenses 
-        if exp.get("date", "").startswith(f"{year}-{str(month).zfill(2)}")
-    ]
+    filtered = Query().in_month(int(year), int(month)).run()
 
     if not filtered:
         messagebox.showinfo("No Results", f"No expenses in {month}/{year}")
@@ -1498,10 +2204,7 @@ def filter_by_month_year(month, year):
         show_filtered_expenses(filtered)
 
 def filter_by_amount_greater_than(x):
-    data = load_data()
-    expenses = data.get("expenses", [])
-
-    filtered = [exp for exp in expenses if exp.get("amount", 0) > x]
+    filtered = Query().amount_above(x).run()
 
     if not filtered:
         messagebox.showinfo("No Results", f"No expenses greater than {selected_currency}{x}")
@@ -1509,10 +2212,7 @@ def filter_by_amount_greater_than(x):
         show_filtered_expenses(filtered)
 
 def filter_by_amount_less_than(x):
-    data = load_data()
-    expenses = data.get("expenses", [])
-
-    filtered = [exp for exp in expenses if exp.get("amount", 0) < x]
+    filtered = Query().amount_below(x).run()
 
     if not filtered:
         messagebox.showinfo("No Results", f"No expenses less than {selected_currency}{x}")
@@ -1520,13 +2220,7 @@ def filter_by_amount_less_than(x):
         show_filtered_expenses(filtered)
 
 def filter_by_amount_between(min_amt, max_amt):
-    data = load_data()
-    expenses = data.get("expenses", [])
-
-    filtered = [
-        exp for exp in expenses 
-        if min_amt <= exp.get("amount", 0) <= max_amt
-    ]
+    filtered = Query().amount_between(min_amt, max_amt).run()
 
     if not filtered:
         messagebox.showinfo("No Results", f"No expenses between {selected_currency}{min_amt} and {selected_currency}{max_amt}")
@@ -1560,8 +2254,21 @@ export_btn.pack(side="left", padx=10)
 summary_btn = ctk.CTkButton(button_frame, text="Visualize Summary", command=open_summary_window)
 summary_btn.pack(side="left", padx=10)
 
+pivot_btn = ctk.CTkButton(button_frame, text="Category x Month", command=open_pivot_window)
+pivot_btn.pack(side="left", padx=10)
+
+trend_btn = ctk.CTkButton(button_frame, text="Trends", command=open_trend_window)
+trend_btn.pack(side="left", padx=10)
+
+budget_btn = ctk.CTkButton(button_frame, text="Budgets", command=open_budget_window)
+budget_btn.pack(side="left", padx=10)
+
+recurring_btn = ctk.CTkButton(button_frame, text="Recurring", command=open_recurring_window)
+recurring_btn.pack(side="left", padx=10)
+
 modify_btn = ctk.CTkButton(button_frame, text="Modify Expense", command=modify_expenses_gui)
 modify_btn.pack(side="left", padx=10)
 
 
+app.after(500, check_scheduled)
 app.mainloop()
\ No newline at end of file
@@ -0,0 +1,835 @@
+from datetime import date
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+import argparse
+import calendar
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from perf import timed, timer
+
+
+# ------------------- Dates -------------------
+# Dates are stored as "YYYY-MM-DD" strings on disk but parsed once at load
+# time into an integer day ordinal plus cached year/month/weekday fields.
+DATE_FIELDS = ("day", "year", "month", "weekday")
+UNKNOWN_DATE = (0, 0, 0, -1)
+
+@lru_cache(maxsize=8192)
+def parse_date_fields(date_str):
+    # Fast path for the fixed ISO layout, raises ValueError like strptime.
+    if (len(date_str) != 10 or date_str[4] != "-" or date_str[7] != "-"
+            or not (date_str[:4] + date_str[5:7] + date_str[8:]).isdigit()):
+        raise ValueError(f"Invalid date: {date_str!r}")
+    d = date(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:]))
+    return d.toordinal(), d.year, d.month, d.weekday()
+
+def parse_day(date_str):
+    return parse_date_fields(date_str)[0]
+
+def day_to_str(day):
+    return date.fromordinal(day).isoformat() if day > 0 else "Unknown"
+
+def month_bounds(year, month):
+    first = date(year, month, 1).toordinal()
+    return first, first + calendar.monthrange(year, month)[1] - 1
+
+def year_bounds(year):
+    return date(year, 1, 1).toordinal(), date(year, 12, 31).toordinal()
+
+def months_between(first_day, last_day):
+    first, last = date.fromordinal(first_day), date.fromordinal(last_day)
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def normalize_expense(exp):
+    try:
+        fields = parse_date_fields(exp.get("date", ""))
+    except (TypeError, ValueError):
+        fields = UNKNOWN_DATE
+    exp["day"], exp["year"], exp["month"], exp["weekday"] = fields
+    return exp
+
+def strip_derived(exp):
+    return {k: v for k, v in exp.items() if k not in DATE_FIELDS}
+
+# ------------------- Validation -------------------
+# Every shard is checked once, when it is read from disk (the result is
+# cached with the file): amounts become floats, ids ints, missing text
+# fields get defaults and categories are normalized, so code past the load
+# can index fields directly. Rows that cannot be repaired (no usable id or
+# amount, a repeated id) are held back from the app but kept in their
+# shard until repair_ledger() moves them to quarantine.json.
+DEFAULT_CATEGORY = "General"
+QUARANTINE_NAME = "quarantine.json"
+
+class InvalidRow(ValueError):
+    pass
+
+def normalize_category(category):
+    category = " ".join(str(category or "").split())
+    return category.title() if category else DEFAULT_CATEGORY
+
+def clean_row(row):
+    # Returns (clean row, names of the fields that were repaired).
+    if not isinstance(row, dict):
+        raise InvalidRow("not a JSON object")
+    clean = strip_derived(row)
+    fixes = []
+
+    exp_id = row.get("id")
+    if isinstance(exp_id, bool) or not isinstance(exp_id, int):
+        try:
+            clean["id"] = int(exp_id)
+        except (TypeError, ValueError):
+            raise InvalidRow("missing or invalid id")
+        fixes.append("id")
+
+    amount = row.get("amount")
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        try:
+            amount = float(amount)
+        except (TypeError, ValueError):
+            raise InvalidRow("missing or invalid amount")
+        fixes.append("amount")
+    if not math.isfinite(amount):
+        raise InvalidRow("amount is not a finite number")
+    clean["amount"] = float(amount)
+
+    for field, default in (("description", ""), ("date", "")):
+        if not isinstance(row.get(field), str):
+            clean[field] = default if row.get(field) is None else str(row[field])
+            fixes.append(field)
+    category = normalize_category(row.get("category"))
+    if category != row.get("category"):
+        clean["category"] = category
+        fixes.append("category")
+    return clean, fixes
+
+def validate_rows(rows):
+    # Returns (clean rows, Counter of repaired fields, [(reason, raw row)]).
+    clean_rows, fixed, rejected = [], Counter(), []
+    seen_ids = set()
+    for row in rows:
+        try:
+            clean, fixes = clean_row(row)
+        except InvalidRow as e:
+            rejected.append((str(e), row))
+            continue
+        if clean["id"] in seen_ids:
+            rejected.append(("duplicate id", row))
+            continue
+        seen_ids.add(clean["id"])
+        fixed.update(fixes)
+        clean_rows.append(clean)
+    return clean_rows, fixed, rejected
+
+# ------------------- Data Handling -------------------
+# Expenses are stored as one JSON shard per year-month under
+# data/partitions, next to a small manifest holding last_id and per-shard
+# counts. Period queries read only the shards they need and saves rewrite
+# only the shards whose rows changed. A legacy data/expenses.json is split
+# into shards the first time it is loaded.
+DATA_FILE = os.path.join("data", "expenses.json")
+MANIFEST_NAME = "manifest.json"
+UNDATED_SHARD = "undated"
+
+# Parsed shard rows keyed by path, reused while the file is unchanged.
+# Entries are (stat stamp, rows, manifest version read under the write
+# lock or None). A same-size rewrite within one mtime tick keeps the stamp,
+# so inside the lock an entry is only trusted if it was read or written
+# under the manifest version current now.
+_shard_cache = {}
+# Validation results per shard path: {"key", "rows", "fixed", "rejected"}.
+_shard_issues = {}
+_version_stamp = [None, 0]
+# Which shard owns each id, per partition directory, for every cached shard.
+# An id found in more than one shard (a move cut short between its two
+# shard writes) is owned by the earliest one; copies in later shards are
+# hidden from loads and lookups, written back as they were on save and
+# moved to quarantine by repair_ledger().
+_id_owner = {}
+_id_copies = {}
+
+def partition_dir():
+    return os.path.join(os.path.dirname(DATA_FILE) or ".", "partitions")
+
+def shard_key(exp):
+    return f"{exp['year']:04d}-{exp['month']:02d}" if exp["year"] else UNDATED_SHARD
+
+def period_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+def clear_partition_cache():
+    _shard_cache.clear()
+    _id_owner.clear()
+    _id_copies.clear()
+
+def _write_json(path, payload, indent=None):
+    # A unique temp file next to the target, so concurrent writers of the
+    # same file never share one, then an atomic rename over it.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding='utf-8') as file:
+            with timer("io", "json_dump"):
+                json.dump(payload, file, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _manifest_path():
+    return os.path.join(partition_dir(), MANIFEST_NAME)
+
+def load_manifest():
+    path = _manifest_path()
+    if os.path.exists(path):
+        with open(path, "r", encoding='utf-8') as file:
+            return json.load(file)
+    if os.path.exists(DATA_FILE):
+        return _migrate_legacy_file()
+    return {"last_id": 0, "partitions": {}}
+
+def _migrate_legacy_file():
+    with open(DATA_FILE, "r", encoding='utf-8') as file:
+        try:
+            legacy = json.load(file)
+        except json.JSONDecodeError:
+            legacy = {}
+    rows, _, rejected = validate_rows(legacy.get("expenses", []))
+    expenses = [normalize_expense(exp) for exp in rows]
+
+    os.makedirs(partition_dir(), exist_ok=True)
+    if rejected:
+        _quarantine([{"shard": "legacy", "reason": reason, "row": row} for reason, row in rejected])
+    _write_json(_manifest_path(), {"last_id": legacy.get("last_id", 0), "partitions": {}}, indent=2)
+    save_data({"expenses": expenses, "last_id": legacy.get("last_id", 0)})
+    os.replace(DATA_FILE, DATA_FILE + ".migrated")
+    return load_manifest()
+
+def _read_shard_rows(key):
+    path = os.path.join(partition_dir(), f"{key}.json")
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        if path in _shard_cache:
+            _index_shard(key, _shard_cache.pop(path)[1], [])
+        return []
+    cached = _shard_cache.get(path)
+    locked_version = _lock_state["version"] if _lock_state["depth"] else None
+    if cached and cached[0] == (stat.st_mtime_ns, stat.st_size) and (
+            locked_version is None or cached[2] == locked_version):
+        return cached[1]
+    with open(path, "r", encoding='utf-8') as file:
+        with timer("io", "json_load"):
+            raw = json.load(file)
+    with timer("io", "validate"):
+        rows, fixed, rejected = validate_rows(raw)
+    if fixed or rejected:
+        _shard_issues[path] = {"key": key, "rows": len(raw), "fixed": fixed, "rejected": rejected}
+    else:
+        _shard_issues.pop(path, None)
+    _index_shard(key, cached[1] if cached else [], rows)
+    _shard_cache[path] = ((stat.st_mtime_ns, stat.st_size), rows, locked_version)
+    return rows
+
+def _index_shard(key, old_rows, rows):
+    owner = _id_owner.setdefault(partition_dir(), {})
+    copies = _id_copies.setdefault(partition_dir(), {})
+    old_ids = {row["id"] for row in old_rows}
+    ids = {row["id"] for row in rows}
+    for exp_id in old_ids - ids:
+        keys = copies.get(exp_id)
+        if keys is None:
+            owner.pop(exp_id, None)
+            continue
+        keys.discard(key)
+        owner[exp_id] = min(keys)
+        if len(keys) == 1:
+            del copies[exp_id]
+    for exp_id in ids - old_ids:
+        current = owner.get(exp_id)
+        if current is None:
+            owner[exp_id] = key
+            continue
+        copies.setdefault(exp_id, {current}).add(key)
+        owner[exp_id] = min(current, key)
+
+def _visible(key, rows):
+    # Drops copies of ids owned by another shard.
+    copies = _id_copies.get(partition_dir())
+    if not copies:
+        return rows
+    owner = _id_owner[partition_dir()]
+    return [row for row in rows if row["id"] not in copies or owner[row["id"]] == key]
+
+def _hidden(key):
+    path = os.path.join(partition_dir(), f"{key}.json")
+    cached = _shard_cache.get(path)
+    if not cached or not _id_copies.get(partition_dir()):
+        return []
+    owner = _id_owner[partition_dir()]
+    return [row for row in cached[1] if owner[row["id"]] != key]
+
+def _held_back(key):
+    issues = _shard_issues.get(os.path.join(partition_dir(), f"{key}.json"))
+    return [row for _, row in issues["rejected"]] if issues else []
+
+def _write_shard_rows(key, rows, hidden=()):
+    # Rows held back by validation and the given hidden duplicate copies
+    # are written back untouched, unless the record itself is in rows.
+    path = os.path.join(partition_dir(), f"{key}.json")
+    ids = {row["id"] for row in rows}
+    hidden = [row for row in hidden if row["id"] not in ids]
+    held = _held_back(key)
+    cached = _shard_cache.pop(path, None)
+    rows = rows + hidden
+    _index_shard(key, cached[1] if cached else [], rows)
+    if not rows and not held:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    _write_json(path, rows + held)
+    stat = os.stat(path)
+    _shard_cache[path] = ((stat.st_mtime_ns, stat.st_size), rows, _lock_state["version"])
+
+def _advance_version(manifest):
+    # Called under the write lock after this process wrote the manifest:
+    # entries that were current stay current at the new version.
+    previous = _lock_state["version"]
+    _lock_state["version"] = manifest["version"]
+    for path, (stamp, rows, version) in list(_shard_cache.items()):
+        if version is not None and version == previous:
+            _shard_cache[path] = (stamp, rows, manifest["version"])
+    _version_stamp[0] = None
+
+def iter_rows(keys=None):
+    # Streams raw stored rows shard by shard without building one big list.
+    partitions = load_manifest()["partitions"]
+    for key in sorted(partitions if keys is None else set(keys) & partitions.keys()):
+        yield from _visible(key, _read_shard_rows(key))
+
+def load_shards(keys):
+    manifest = load_manifest()
+    keys = sorted(set(keys) & manifest["partitions"].keys())
+    # Every shard is read before any is filtered, so a copy in a later
+    # shard is hidden even if the shards were not read in order.
+    shards = [(key, _read_shard_rows(key)) for key in keys]
+    expenses = []
+    for key, rows in shards:
+        expenses.extend(normalize_expense(dict(row)) for row in _visible(key, rows))
+    expenses.sort(key=lambda exp: exp["id"])
+    return {"expenses": expenses, "last_id": manifest["last_id"], "shards": keys, "version": manifest.get("version", 0)}
+
+@timed("io")
+def load_data(periods=None):
+    if periods is None:
+        data = load_shards(load_manifest()["partitions"])
+        data["shards"] = None
+        return data
+    return load_shards(period_key(year, month) for year, month in periods)
+
+@timed("io")
+def save_data(data):
+    with write_lock():
+        _save_locked(data)
+
+def _save_locked(data):
+    manifest = load_manifest()
+    # Data loaded before another writer committed would undo its changes.
+    if data.get("version") is not None and data["version"] != manifest.get("version", 0):
+        raise StaleDataError("The ledger was changed by another writer; reload and try again.")
+    partitions = manifest["partitions"]
+    # None means the whole ledger was loaded; otherwise only these shards.
+    scope = data.get("shards")
+
+    groups = defaultdict(list)
+    for exp in data["expenses"]:
+        groups[shard_key(exp)].append(strip_derived(exp))
+
+    ids = {exp["id"] for exp in data["expenses"] if "id" in exp}
+    in_scope = set(partitions) if scope is None else set(scope)
+    os.makedirs(partition_dir(), exist_ok=True)
+
+    # Visible and hidden rows are split before any shard is written, so a
+    # record moving out of the shard that owns it does not turn its old
+    # copy into a hidden one.
+    keys = in_scope | groups.keys()
+    shards = {key: _read_shard_rows(key) for key in keys if key in partitions}
+    visible = {key: _visible(key, rows) for key, rows in shards.items()}
+    hidden = {key: _hidden(key) for key in shards}
+    for key in keys:
+        old_rows = visible.get(key, [])
+        if key in in_scope:
+            rows = groups.get(key, [])
+        else:
+            # A record moved into a shard that was not loaded: merge, don't replace.
+            rows = [row for row in old_rows if row.get("id") not in ids] + groups[key]
+        if rows == old_rows:
+            continue
+        _write_shard_rows(key, rows, hidden.get(key, ()))
+        if rows or _held_back(key) or _hidden(key):
+            partitions[key] = {"count": len(rows), "total": round(sum(row["amount"] for row in rows), 2)}
+        else:
+            partitions.pop(key, None)
+
+    manifest["last_id"] = max([manifest["last_id"], data.get("last_id", 0), *ids])
+    manifest["version"] = manifest.get("version", 0) + 1
+    _write_json(_manifest_path(), manifest, indent=2)
+    _advance_version(manifest)
+    data["version"] = manifest["version"]
+
+def validation_report():
+    # Reads every shard (cached ones are free) and gathers what was fixed,
+    # held back, or hidden as a copy of an id owned by an earlier shard.
+    partitions = load_manifest()["partitions"]
+    for key in partitions:
+        _read_shard_rows(key)
+    owner = _id_owner.get(partition_dir(), {})
+    duplicates = {key: _hidden(key) for key in partitions}
+    prefix = partition_dir()
+    report = {"fixed": Counter(), "rejected": [], "shards": []}
+    issues_by_key = {issues["key"]: issues for path, issues in _shard_issues.items()
+                     if os.path.dirname(path) == prefix and os.path.exists(path)}
+    for key in sorted(issues_by_key.keys() | {key for key, rows in duplicates.items() if rows}):
+        issues = issues_by_key.get(key, {"fixed": Counter(), "rejected": []})
+        report["shards"].append(key)
+        report["fixed"].update(issues["fixed"])
+        report["rejected"].extend({"shard": key, "reason": reason, "row": row}
+                                  for reason, row in issues["rejected"])
+        report["rejected"].extend({"shard": key, "reason": f"duplicate id (kept in {owner[row['id']]})", "row": row}
+                                  for row in duplicates.get(key, []))
+    return report
+
+def format_report(report):
+    if not report["shards"]:
+        return "All expenses passed validation."
+    lines = [f"Shards with issues: {', '.join(report['shards'])}"]
+    for field, count in report["fixed"].most_common():
+        lines.append(f"  repaired {field}: {count} row(s)")
+    for item in report["rejected"]:
+        lines.append(f"  quarantined from {item['shard']} ({item['reason']}): {json.dumps(item['row'])[:120]}")
+    return "\n".join(lines)
+
+def _quarantine(items):
+    path = os.path.join(partition_dir(), QUARANTINE_NAME)
+    existing = []
+    if os.path.exists(path):
+        with open(path, "r", encoding='utf-8') as file:
+            try:
+                existing = json.load(file)
+            except json.JSONDecodeError:
+                existing = None
+        if not isinstance(existing, list):
+            # Keep an unreadable quarantine file aside rather than lose it.
+            os.replace(path, path + ".corrupt")
+            existing = []
+    _write_json(path, existing + items, indent=2)
+
+@timed("io")
+def repair_ledger():
+    # Rewrites shards with their repaired rows and moves held-back rows
+    # to quarantine.json, so validation finds nothing on the next load.
+    with write_lock():
+        report = validation_report()
+        if not report["shards"]:
+            return report
+        if report["rejected"]:
+            _quarantine(report["rejected"])
+        manifest = load_manifest()
+        for key in report["shards"]:
+            rows = _visible(key, _read_shard_rows(key))
+            _shard_issues.pop(os.path.join(partition_dir(), f"{key}.json"), None)
+            _write_shard_rows(key, rows)
+            if rows:
+                manifest["partitions"][key] = {"count": len(rows), "total": round(sum(row["amount"] for row in rows), 2)}
+            else:
+                manifest["partitions"].pop(key, None)
+        manifest["version"] = manifest.get("version", 0) + 1
+        _write_json(_manifest_path(), manifest, indent=2)
+        _advance_version(manifest)
+    return report
+
+def data_version():
+    # Bumped by every save; cached results keyed on it go stale on write.
+    try:
+        stat = os.stat(_manifest_path())
+    except FileNotFoundError:
+        return 0
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if _version_stamp[0] != stamp:
+        _version_stamp[0] = stamp
+        _version_stamp[1] = load_manifest().get("version", 0)
+    return _version_stamp[1]
+
+@timed("io")
+def add_expense(description, amount, date, category):
+    new_expense = add_many([{
+    "description": description,
+    "amount": amount,
+    "date": date,
+    "category": category
+    }])[0]
+
+    print(f"Expense added successfully (ID: {new_expense['id']})")
+
+@timed("io")
+def add_many(rows):
+    # One lock, one id range and one write per touched shard for the batch.
+    # rule_id links a posted occurrence back to its recurring rule.
+    new_expenses = [normalize_expense({
+        "description": str(row["description"]), "amount": float(row["amount"]),
+        "date": row["date"], "category": normalize_category(row["category"]),
+        **({"rule_id": row["rule_id"]} if row.get("rule_id") is not None else {}),
+    }) for row in rows]
+    if not new_expenses:
+        return []
+    with write_lock():
+        data = load_shards({shard_key(exp) for exp in new_expenses})
+
+        first_id = data["last_id"] + 1
+        new_expenses = [{"id": first_id + i, **exp} for i, exp in enumerate(new_expenses)]
+        data["last_id"] = first_id + len(new_expenses) - 1
+
+        data["expenses"].extend(new_expenses)
+        save_data(data)
+    notify("add", new_expenses)
+    return new_expenses
+
+# ------------------- Concurrency -------------------
+# Writers in different processes serialize on an advisory fcntl lock on
+# partitions/.lock (an O_EXCL lock file where fcntl is missing); threads in
+# one process share an RLock in front of it, and nested calls reuse the
+# held lock. Critical sections only cover the read-check-write of the
+# shards involved. Records carry a "rev" counter: an edit made from a stale
+# copy is applied only if none of the fields it touches changed meanwhile,
+# otherwise it raises ConflictError.
+LOCK_NAME = ".lock"
+LOCK_TIMEOUT = 10.0
+RETRY_ATTEMPTS = 5
+
+class ConflictError(Exception):
+    pass
+
+class StaleDataError(ConflictError):
+    # The whole loaded snapshot is out of date; reloading fixes it.
+    pass
+
+_thread_lock = threading.RLock()
+_lock_state = {"depth": 0, "handle": None, "version": None}
+
+def _locked_manifest_version():
+    # Read straight from disk: the stat-keyed data_version() cache could
+    # miss a same-size rewrite by another process.
+    try:
+        with open(_manifest_path(), "r", encoding='utf-8') as file:
+            return json.load(file).get("version", 0)
+    except FileNotFoundError:
+        return 0
+    except json.JSONDecodeError:
+        return None
+
+def _acquire_file_lock(path, deadline):
+    delay = 0.001
+    while True:
+        try:
+            if fcntl is not None:
+                handle = open(path, "a+")
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    handle.close()
+                    raise
+                return handle
+            return os.open(path + ".held", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except (BlockingIOError, FileExistsError, PermissionError):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for the ledger lock at {path}")
+            time.sleep(delay * (1 + random.random()))
+            delay = min(delay * 2, 0.05)
+
+def _release_file_lock(handle, path):
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+    else:
+        os.close(handle)
+        os.remove(path + ".held")
+
+@contextmanager
+def write_lock(timeout=LOCK_TIMEOUT):
+    if not _thread_lock.acquire(timeout=timeout):
+        raise TimeoutError("Timed out waiting for the ledger lock")
+    try:
+        if _lock_state["depth"] == 0:
+            os.makedirs(partition_dir(), exist_ok=True)
+            path = os.path.join(partition_dir(), LOCK_NAME)
+            with timer("io", "lock_wait"):
+                _lock_state["handle"] = (_acquire_file_lock(path, time.monotonic() + timeout), path)
+            _lock_state["version"] = _locked_manifest_version()
+        _lock_state["depth"] += 1
+        try:
+            yield
+        finally:
+            _lock_state["depth"] -= 1
+            if _lock_state["depth"] == 0:
+                _release_file_lock(*_lock_state["handle"])
+                _lock_state["handle"] = None
+                _lock_state["version"] = None
+    finally:
+        _thread_lock.release()
+
+def retry(operation, attempts=RETRY_ATTEMPTS):
+    # Reruns operation on a lost race; it must re-read whatever it needs.
+    # Record-level conflicts are not retried: the caller's edit is stale.
+    for attempt in range(attempts):
+        try:
+            return operation()
+        except (StaleDataError, TimeoutError):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.01 * 2 ** attempt * (1 + random.random()))
+
+def locate_records(ids):
+    # Reads every shard (cached ones only cost a stat) so each id is found
+    # in the shard that owns it, not in a leftover copy.
+    ids = set(ids)
+    partitions = load_manifest()["partitions"]
+    shards = {key: _read_shard_rows(key) for key in partitions}
+    owner = _id_owner.get(partition_dir(), {})
+    found = {}
+    for key in {owner[exp_id] for exp_id in ids if exp_id in owner}:
+        for row in shards.get(key, ()):
+            if row["id"] in ids and owner[row["id"]] == key:
+                found[row["id"]] = (key, normalize_expense(dict(row)))
+    return found
+
+def find_record(exp_id):
+    return locate_records([exp_id]).get(exp_id, (None, None))
+
+def _check_revision(current, seen, fields):
+    if seen is None or current.get("rev", 0) == seen.get("rev", 0):
+        return
+    if any(current.get(field) != seen.get(field) for field in fields):
+        raise ConflictError(f"Expense {current['id']} was changed by another writer; reload and try again.")
+
+@timed("io")
+def update_many(edits):
+    # edits are (seen, changes) pairs: the record as the caller loaded it
+    # and the fields to change. Each shard is replaced atomically, but a
+    # batch touching several shards is not: a crash between two shard
+    # writes can leave some edits unwritten, or a moved record in both
+    # shards, where loads keep the earlier shard's copy.
+    edits = list(edits)
+    if not edits:
+        return []
+    with write_lock():
+        found = locate_records(seen["id"] for seen, _ in edits)
+        pairs = []
+        for seen, changes in edits:
+            key, current = found.get(seen["id"], (None, None))
+            if current is None:
+                raise ConflictError(f"Expense {seen['id']} was deleted by another writer.")
+            _check_revision(current, seen, changes)
+            updated, _ = clean_row({**strip_derived(current), **changes, "rev": current.get("rev", 0) + 1})
+            updated = normalize_expense(updated)
+            pairs.append((key, current, updated))
+
+        by_id = {updated["id"]: updated for _, _, updated in pairs}
+        data = load_shards({key for key, _, _ in pairs} | {shard_key(updated) for updated in by_id.values()})
+        data["expenses"] = [by_id.get(exp["id"], exp) for exp in data["expenses"]]
+        save_data(data)
+    notify("update", [(current, updated) for _, current, updated in pairs])
+    return [updated for _, _, updated in pairs]
+
+@timed("io")
+def delete_many(ids, seen=()):
+    # seen optionally holds the records as the caller loaded them, so a
+    # record edited elsewhere since is not deleted unnoticed.
+    seen = {exp["id"]: exp for exp in seen}
+    with write_lock():
+        found = locate_records(ids)
+        for exp_id, (_, current) in found.items():
+            _check_revision(current, seen.get(exp_id), [k for k in current if k not in DATE_FIELDS])
+        if not found:
+            return []
+        data = load_shards({key for key, _ in found.values()})
+        data["expenses"] = [exp for exp in data["expenses"] if exp["id"] not in found]
+        save_data(data)
+    deleted = [current for _, current in found.values()]
+    notify("delete", deleted)
+    return deleted
+
+def update_record(seen, changes):
+    return update_many([(seen, changes)])[0]
+
+def delete_record(exp_id, seen=None):
+    deleted = delete_many([exp_id], [seen] if seen else ())
+    return deleted[0] if deleted else None
+
+# ------------------- Change Events -------------------
+# Listeners are called as callback(event, rows) after a write has been
+# saved, with event one of "add", "update" or "delete". For "update" each
+# entry of rows is an (old, new) pair.
+_listeners = []
+
+def subscribe(callback):
+    _listeners.append(callback)
+    return callback
+
+def unsubscribe(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+def notify(event, rows):
+    for callback in list(_listeners):
+        callback(event, rows)
+
+# ------------------- Queries -------------------
+@timed("query")
+def in_category(expenses, category):
+    return [exp for exp in expenses if exp["category"] == category]
+
+@timed("query")
+def on_day(expenses, day):
+    return [exp for exp in expenses if exp["day"] == day]
+
+@timed("query")
+def between_days(expenses, first, last):
+    return [exp for exp in expenses if first <= exp["day"] <= last]
+
+@timed("query")
+def in_month(expenses, year, month):
+    first, last = month_bounds(year, month)
+    return between_days(expenses, first, last)
+
+@timed("query")
+def amount_above(expenses, x):
+    return [exp for exp in expenses if exp["amount"] > x]
+
+@timed("query")
+def amount_below(expenses, x):
+    return [exp for exp in expenses if exp["amount"] < x]
+
+@timed("query")
+def amount_between(expenses, min_amt, max_amt):
+    return [exp for exp in expenses if min_amt <= exp["amount"] <= max_amt]
+
+@timed("query")
+def search_description(expenses, keyword):
+    keyword = keyword.strip().lower()
+    return [exp for exp in expenses if keyword in exp["description"].lower()]
+
+def total_amount(expenses):
+    return sum(exp["amount"] for exp in expenses)
+
+# ------------------- Group-By -------------------
+# One pass over the rows fills a [count, sum, min, max] accumulator per
+# group; means are derived at the end. Keys read the date fields parsed at
+# load time, so grouping never touches the date strings.
+GROUP_KEYS = {
+    "category": lambda exp: exp["category"],
+    "year": lambda exp: exp["year"],
+    "month": lambda exp: exp["month"],
+    "day": lambda exp: exp["day"],
+    "weekday": lambda exp: exp["weekday"],
+}
+
+def _group_stats(count, total, low, high):
+    return {"count": count, "sum": total, "mean": total / count if count else 0.0, "min": low, "max": high}
+
+@timed("aggregate")
+def group_by(expenses, keys=()):
+    for key in keys:
+        if key not in GROUP_KEYS:
+            raise ValueError(f"Unknown group key: {key!r}")
+    getters = [GROUP_KEYS[key] for key in keys]
+    groups = {}
+    for exp in expenses:
+        group = tuple(getter(exp) for getter in getters)
+        amount = exp["amount"]
+        acc = groups.get(group)
+        if acc is None:
+            groups[group] = [1, amount, amount, amount]
+            continue
+        acc[0] += 1
+        acc[1] += amount
+        if amount < acc[2]:
+            acc[2] = amount
+        elif amount > acc[3]:
+            acc[3] = amount
+    return {group: _group_stats(*acc) for group, acc in groups.items()}
+
+def combine_groups(groups):
+    # Folds per-group stats into one overall group.
+    stats = list(groups.values())
+    if not stats:
+        return _group_stats(0, 0.0, None, None)
+    return _group_stats(
+        sum(s["count"] for s in stats), sum(s["sum"] for s in stats),
+        min(s["min"] for s in stats), max(s["max"] for s in stats),
+    )
+
+# ------------------- Dashboard Metrics -------------------
+@timed("aggregate")
+def dashboard_metrics(expenses, group_descriptions=None, sketches=None):
+    # With sketches, every card comes from bounded-memory summaries kept
+    # next to the ledger and expenses is not read (it may be None).
+    if sketches is None:
+        by_category = group_by(expenses, ("category",))
+        overall = combine_groups(by_category)
+        highest_expense = overall["max"] if overall["count"] else 0
+        highest_expense_entry = next((exp for exp in expenses if exp["amount"] == highest_expense), None)
+        costliest_day = highest_expense_entry["date"] if highest_expense_entry else "N/A"
+        lowest_expense = overall["min"] if overall["count"] else 0
+        category_counts = Counter({group[0]: stats["count"] for group, stats in by_category.items()})
+        date_counts = Counter(exp["day"] for exp in expenses)
+        most_active_day = date_counts.most_common(1)[0] if date_counts else None
+        most_active_day = (day_to_str(most_active_day[0]), most_active_day[1]) if most_active_day else ("N/A", 0)
+        desc_counts = Counter(exp["description"].strip().lower() for exp in expenses)
+    else:
+        overall = {"sum": sketches.total, "count": sketches.count,
+                   "mean": sketches.total / sketches.count if sketches.count else 0.0}
+        highest_expense, costliest_day = sketches.highest or (0, "N/A")
+        lowest_expense = sketches.lowest or 0
+        category_counts = sketches.categories
+        most_active_day = sketches.most_active_day()
+        desc_counts = sketches.top_descriptions()
+    if group_descriptions is not None:
+        desc_counts = group_descriptions(desc_counts)
+
+    return {
+        "total_spent": overall["sum"],
+        "total_entries": overall["count"],
+        "total_categories": len(category_counts),
+        "avg_expense": overall["mean"],
+        "top_category": category_counts.most_common(1)[0][0] if category_counts else "N/A",
+        "highest_expense": highest_expense,
+        "costliest_day": costliest_day,
+        "least_used_category": (
+            min(category_counts.items(), key=lambda x: x[1])[0] if category_counts else "N/A"
+        ),
+        "lowest_expense": lowest_expense,
+        "most_active_day": most_active_day,
+        "recurring_desc": desc_counts.most_common(1)[0][0].title() if desc_counts else "N/A",
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate the stored expenses.")
+    parser.add_argument("--repair", action="store_true", help="write repairs and move rejected rows to quarantine.json")
+    args = parser.parse_args()
+    print(format_report(repair_ledger() if args.repair else validation_report()))
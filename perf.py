@@ -0,0 +1,127 @@
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import atexit
+import bisect
+import json
+import os
+import time
+
+
+# ------------------- Settings -------------------
+# Instrumentation is off unless EXPENSE_TRACKER_PROFILE is set (or it is
+# switched on from the Settings window). When off, wrapped functions pay a
+# single flag check per call.
+ENABLED = os.environ.get("EXPENSE_TRACKER_PROFILE", "") not in ("", "0")
+DUMP_FILE = os.environ.get("EXPENSE_TRACKER_PROFILE_DUMP", "")
+
+STAGES = ("io", "query", "aggregate", "render", "api")
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_stats = {}
+_recent = deque(maxlen=200)
+
+def set_enabled(enabled):
+    global ENABLED
+    ENABLED = bool(enabled)
+
+def reset():
+    _stats.clear()
+    _recent.clear()
+
+# ------------------- Recording -------------------
+def record(stage, name, seconds):
+    key = (stage, name)
+    stat = _stats.get(key)
+    if stat is None:
+        stat = _stats[key] = {"count": 0, "total": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS_MS) + 1)}
+    ms = seconds * 1000
+    stat["count"] += 1
+    stat["total"] += ms
+    if ms > stat["max"]:
+        stat["max"] = ms
+    stat["buckets"][bisect.bisect_left(BUCKETS_MS, ms)] += 1
+    _recent.append((time.time(), stage, name, ms))
+
+@contextmanager
+def timer(stage, name):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, name, time.perf_counter() - start)
+
+def timed(stage, name=None):
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(stage, label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+# ------------------- Reporting -------------------
+def _bucket_quantile(buckets, count, q):
+    target = q * count
+    seen = 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= target:
+            return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+    return float("inf")
+
+def snapshot():
+    rows = []
+    for (stage, name), stat in sorted(_stats.items()):
+        count = stat["count"]
+        rows.append({
+            "stage": stage,
+            "name": name,
+            "count": count,
+            "mean_ms": stat["total"] / count,
+            "max_ms": stat["max"],
+            "p50_ms": _bucket_quantile(stat["buckets"], count, 0.5),
+            "p95_ms": _bucket_quantile(stat["buckets"], count, 0.95),
+            "histogram": dict(zip([f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"], stat["buckets"])),
+        })
+    return rows
+
+def recent(limit=50):
+    return list(_recent)[-limit:]
+
+def format_report():
+    rows = snapshot()
+    if not rows:
+        return "No timings recorded yet."
+    lines = [f"{'Stage':<10}{'Name':<24}{'Calls':>7}{'Mean ms':>10}{'p95 ms':>9}{'Max ms':>10}"]
+    for row in rows:
+        lines.append(
+            f"{row['stage']:<10}{row['name']:<24}{row['count']:>7}"
+            f"{row['mean_ms']:>10.2f}{row['p95_ms']:>9}{row['max_ms']:>10.2f}"
+        )
+    lines.append("\nRecent:")
+    for stamp, stage, name, ms in reversed(recent(20)):
+        lines.append(f"{time.strftime('%H:%M:%S', time.localtime(stamp))}  {stage}/{name}: {ms:.2f} ms")
+    return "\n".join(lines)
+
+def dump_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"timings": snapshot(), "recent": recent(len(_recent))}, f, indent=2)
+
+def _dump_on_exit():
+    if DUMP_FILE and _stats:
+        dump_json(DUMP_FILE)
+
+atexit.register(_dump_on_exit)
@@ -0,0 +1,206 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+import ledger
+from cache import query_cache
+from perf import timed
+
+
+# ------------------- Query -------------------
+# A Query stacks category, date range, amount range and keyword conditions.
+# Queries are immutable: every builder method returns a new Query, so a base
+# query can be refined without affecting other users of it.
+class Query:
+    FIELDS = ("category", "first_day", "last_day", "min_amount", "max_amount",
+              "min_inclusive", "max_inclusive", "text")
+
+    def __init__(self, category=None, first_day=None, last_day=None, min_amount=None,
+                 max_amount=None, min_inclusive=True, max_inclusive=True, text=None):
+        self.category = category.lower() if category else None
+        self.first_day = first_day
+        self.last_day = last_day
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.min_inclusive = min_inclusive
+        self.max_inclusive = max_inclusive
+        self.text = text.strip().lower() if text and text.strip() else None
+
+    def _with(self, **changes):
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values.update(changes)
+        return Query(**values)
+
+    def where_category(self, category):
+        return self._with(category=category)
+
+    def between_days(self, first_day, last_day):
+        return self._with(first_day=first_day, last_day=last_day)
+
+    def on(self, date_str):
+        day = ledger.parse_day(date_str)
+        return self.between_days(day, day)
+
+    def in_month(self, year, month):
+        return self.between_days(*ledger.month_bounds(year, month))
+
+    def amount_above(self, x):
+        return self._with(min_amount=x, min_inclusive=False)
+
+    def amount_below(self, x):
+        return self._with(max_amount=x, max_inclusive=False)
+
+    def amount_at_least(self, x):
+        return self._with(min_amount=x, min_inclusive=True)
+
+    def amount_at_most(self, x):
+        return self._with(max_amount=x, max_inclusive=True)
+
+    def amount_between(self, min_amt, max_amt):
+        return self._with(min_amount=min_amt, max_amount=max_amt, min_inclusive=True, max_inclusive=True)
+
+    def matching(self, text):
+        return self._with(text=text)
+
+    def key(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def describe(self):
+        parts = []
+        if self.category:
+            parts.append(f"category '{self.category.title()}'")
+        if self.first_day is not None or self.last_day is not None:
+            first = ledger.day_to_str(self.first_day) if self.first_day else "start"
+            last = ledger.day_to_str(self.last_day) if self.last_day else "today"
+            parts.append(f"date {first}" if first == last else f"dates {first} to {last}")
+        if self.min_amount is not None:
+            parts.append(f"amount {'>=' if self.min_inclusive else '>'} {self.min_amount:g}")
+        if self.max_amount is not None:
+            parts.append(f"amount {'<=' if self.max_inclusive else '<'} {self.max_amount:g}")
+        if self.text:
+            parts.append(f"matching '{self.text}'")
+        return ", ".join(parts) or "all expenses"
+
+    def periods(self):
+        if self.first_day is None or self.last_day is None:
+            return None
+        if self.first_day > self.last_day:
+            return []
+        return list(ledger.months_between(self.first_day, self.last_day))
+
+    # ------------------- Matching -------------------
+    def matcher(self, skip=()):
+        category = None if "category" in skip else self.category
+        first_day = None if "day" in skip else self.first_day
+        last_day = None if "day" in skip else self.last_day
+        min_amount = None if "amount" in skip else self.min_amount
+        max_amount = None if "amount" in skip else self.max_amount
+        min_inclusive, max_inclusive, text = self.min_inclusive, self.max_inclusive, self.text
+
+        def matches(exp):
+            if category is not None and exp["category"].lower() != category:
+                return False
+            day = exp["day"]
+            if first_day is not None and day < first_day:
+                return False
+            if last_day is not None and day > last_day:
+                return False
+            amount = exp["amount"]
+            if min_amount is not None and (amount < min_amount if min_inclusive else amount <= min_amount):
+                return False
+            if max_amount is not None and (amount > max_amount if max_inclusive else amount >= max_amount):
+                return False
+            if text is not None and text not in exp["description"].lower():
+                return False
+            return True
+        return matches
+
+    # ------------------- Planning -------------------
+    def plan(self, index):
+        # Estimate how many rows each indexed condition leaves and drive the
+        # scan from the smallest candidate set.
+        options = [("all", len(index.expenses), None)]
+        if self.category:
+            options.append(("category", index.category_count(self.category), None))
+        if self.first_day is not None or self.last_day is not None:
+            lo, hi = index.day_span(self.first_day, self.last_day)
+            options.append(("day", hi - lo, (lo, hi)))
+        if self.min_amount is not None or self.max_amount is not None:
+            lo, hi = index.amount_span(self.min_amount, self.max_amount, self.min_inclusive, self.max_inclusive)
+            options.append(("amount", hi - lo, (lo, hi)))
+        return min(options, key=lambda option: option[1])
+
+    @timed("query", "query_run")
+    def run(self, expenses=None, index=None):
+        if index is not None:
+            driver, _, span = self.plan(index)
+            matches = self.matcher(skip=(driver,))
+            result = [exp for exp in index.candidates(driver, self.category, span) if matches(exp)]
+            result.sort(key=lambda exp: exp["id"])
+            return result
+
+        if expenses is None:
+            return query_cache.get_or_compute("query", self.key(), self._run_stored)
+        matches = self.matcher()
+        return [exp for exp in expenses if matches(exp)]
+
+    def _run_stored(self):
+        periods = self.periods()
+        if periods == []:
+            return []
+        return self.run(expenses=ledger.load_data(periods=periods)["expenses"])
+
+# ------------------- Index -------------------
+class LedgerIndex:
+    def __init__(self, expenses):
+        self.expenses = expenses
+        self.by_category = defaultdict(list)
+        for exp in expenses:
+            self.by_category[exp["category"].lower()].append(exp)
+
+        by_day = sorted(expenses, key=lambda exp: exp["day"])
+        self.day_rows = by_day
+        self.days = [exp["day"] for exp in by_day]
+
+        by_amount = sorted(expenses, key=lambda exp: exp["amount"])
+        self.amount_rows = by_amount
+        self.amounts = [exp["amount"] for exp in by_amount]
+
+    def add(self, exp):
+        # Keeps the sorted columns ordered without a full rebuild.
+        self.expenses.append(exp)
+        self.by_category[exp["category"].lower()].append(exp)
+        pos = bisect_right(self.days, exp["day"])
+        self.days.insert(pos, exp["day"])
+        self.day_rows.insert(pos, exp)
+        amount = exp["amount"]
+        pos = bisect_right(self.amounts, amount)
+        self.amounts.insert(pos, amount)
+        self.amount_rows.insert(pos, exp)
+
+    def category_count(self, category):
+        return len(self.by_category.get(category, ()))
+
+    def day_span(self, first_day, last_day):
+        lo = 0 if first_day is None else bisect_left(self.days, first_day)
+        hi = len(self.days) if last_day is None else bisect_right(self.days, last_day)
+        return lo, max(lo, hi)
+
+    def amount_span(self, min_amount, max_amount, min_inclusive=True, max_inclusive=True):
+        if min_amount is None:
+            lo = 0
+        else:
+            lo = (bisect_left if min_inclusive else bisect_right)(self.amounts, min_amount)
+        if max_amount is None:
+            hi = len(self.amounts)
+        else:
+            hi = (bisect_right if max_inclusive else bisect_left)(self.amounts, max_amount)
+        return lo, max(lo, hi)
+
+    def candidates(self, driver, category=None, span=None):
+        if driver == "category":
+            return self.by_category.get(category, [])
+        if driver == "day":
+            return self.day_rows[span[0]:span[1]]
+        if driver == "amount":
+            return self.amount_rows[span[0]:span[1]]
+        return self.expenses
@@ -0,0 +1,214 @@
+from datetime import date
+import argparse
+import heapq
+import json
+import os
+
+import ledger
+from perf import timed
+
+
+# ------------------- Recurring Rules -------------------
+# A rule (rent, a subscription) is stored once: description, amount,
+# category, frequency, start and optional end date. Occurrences are never
+# pre-generated; they are computed for whatever span is being shown, and
+# only posted to the ledger once they fall due. posted_through records the
+# last occurrence already written, and posted rows keep their rule_id, so
+# posting is idempotent even if the rules file write is lost.
+RULES_FILE = "recurring.json"
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+def _rules_path():
+    return os.path.join(ledger.partition_dir(), RULES_FILE)
+
+def load_rules():
+    if not os.path.exists(_rules_path()):
+        return {"last_id": 0, "rules": []}
+    with open(_rules_path(), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_rules(store):
+    os.makedirs(ledger.partition_dir(), exist_ok=True)
+    ledger._write_json(_rules_path(), store, indent=2)
+    _scheduler[0] = None
+
+def add_rule(description, amount, category, frequency, start, end=None):
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Frequency must be one of: {', '.join(FREQUENCIES)}")
+    if end and ledger.parse_day(end) < ledger.parse_day(start):
+        raise ValueError("End date is before the start date.")
+    with ledger.write_lock():
+        store = load_rules()
+        store["last_id"] += 1
+        rule = {
+            "id": store["last_id"], "description": description, "amount": float(amount),
+            "category": category, "frequency": frequency, "start": start, "end": end or None,
+            "posted_through": None,
+        }
+        store["rules"].append(rule)
+        save_rules(store)
+    return rule
+
+def delete_rule(rule_id):
+    with ledger.write_lock():
+        store = load_rules()
+        rules = [rule for rule in store["rules"] if rule["id"] != rule_id]
+        if len(rules) == len(store["rules"]):
+            return False
+        store["rules"] = rules
+        save_rules(store)
+    return True
+
+# ------------------- Occurrences -------------------
+def _bounds(rule):
+    start = ledger.parse_day(rule["start"])
+    end = ledger.parse_day(rule["end"]) if rule.get("end") else None
+    return start, end
+
+def _monthly(start, months):
+    # The start's day of month, clamped to short months (31st -> 28th/30th).
+    first = date.fromordinal(start)
+    year, month = divmod(first.year * 12 + first.month - 1 + months, 12)
+    month_first, month_last = ledger.month_bounds(year, month + 1)
+    return min(month_first + first.day - 1, month_last)
+
+def next_occurrence(rule, day):
+    # First occurrence on or after `day`, or None once the rule has ended.
+    start, end = _bounds(rule)
+    day = max(day, start)
+    if rule["frequency"] == "daily":
+        found = day
+    elif rule["frequency"] == "weekly":
+        found = start + -(-(day - start) // 7) * 7
+    else:
+        first = date.fromordinal(start)
+        current = date.fromordinal(day)
+        months = (current.year - first.year) * 12 + current.month - first.month
+        found = _monthly(start, months)
+        if found < day:
+            found = _monthly(start, months + 1)
+    return None if end is not None and found > end else found
+
+def occurrences(rule, first_day, last_day):
+    day = next_occurrence(rule, first_day)
+    while day is not None and day <= last_day:
+        yield day
+        day = next_occurrence(rule, day + 1)
+
+def occurrence_row(rule, day):
+    return {
+        "description": rule["description"], "amount": rule["amount"],
+        "date": ledger.day_to_str(day), "category": rule["category"], "rule_id": rule["id"],
+    }
+
+@timed("query")
+def expand(first_day, last_day, rules=None):
+    # Scheduled rows for one span, computed on demand and never stored.
+    rules = load_rules()["rules"] if rules is None else rules
+    rows = [occurrence_row(rule, day) for rule in rules for day in occurrences(rule, first_day, last_day)]
+    rows.sort(key=lambda row: row["date"])
+    return rows
+
+# ------------------- Due Scheduler -------------------
+# A min-heap of (next unposted occurrence, rule id), built once per process
+# and kept while the rules file is unchanged. The earliest due item is
+# always at the top, so "is anything due?" is a peek, and only rules that
+# are actually due are popped, each for O(log R) with R rules.
+class DueScheduler:
+    def __init__(self, store, stamp=None):
+        self.store = store
+        self.stamp = stamp
+        self.rules = {rule["id"]: rule for rule in store["rules"]}
+        self.heap = []
+        for rule in store["rules"]:
+            posted = rule.get("posted_through")
+            day = next_occurrence(rule, ledger.parse_day(posted) + 1 if posted else 0)
+            if day is not None:
+                self.heap.append((day, rule["id"]))
+        heapq.heapify(self.heap)
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, through_day):
+        while self.heap and self.heap[0][0] <= through_day:
+            day, rule_id = heapq.heappop(self.heap)
+            rule = self.rules[rule_id]
+            following = next_occurrence(rule, day + 1)
+            if following is not None:
+                heapq.heappush(self.heap, (following, rule_id))
+            yield day, rule
+
+    def upcoming(self, through_day):
+        # Read-only look ahead: takes the due rules off the heap, lists
+        # their occurrences and pushes the same entries back.
+        taken = []
+        while self.heap and self.heap[0][0] <= through_day:
+            taken.append(heapq.heappop(self.heap))
+        items = [(day, rule_id) for first, rule_id in taken
+                 for day in occurrences(self.rules[rule_id], first, through_day)]
+        for entry in taken:
+            heapq.heappush(self.heap, entry)
+        return [(day, self.rules[rule_id]) for day, rule_id in sorted(items)]
+
+_scheduler = [None]
+
+def _rules_stamp():
+    try:
+        stat = os.stat(_rules_path())
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def due_scheduler():
+    # Rebuilt only when the rules file changed (a rule added or removed,
+    # or a post by another process).
+    stamp = _rules_stamp()
+    scheduler = _scheduler[0]
+    if scheduler is None or scheduler.stamp != stamp:
+        scheduler = _scheduler[0] = DueScheduler(load_rules(), stamp)
+    return scheduler
+
+def today():
+    return date.today().toordinal()
+
+def due_items(through_day=None):
+    return due_scheduler().upcoming(today() if through_day is None else through_day)
+
+@timed("io")
+def post_due(through_day=None):
+    # Writes every unposted occurrence up to through_day to the ledger.
+    through_day = today() if through_day is None else through_day
+    with ledger.write_lock():
+        scheduler = due_scheduler()
+        if scheduler.next_due() is None or scheduler.next_due() > through_day:
+            return []
+        try:
+            due = list(scheduler.pop_due(through_day))
+            # Posted rows carry rule_id; skip any occurrence already in the
+            # ledger, e.g. when the rules file was not saved after a post.
+            rows = [occurrence_row(rule, day) for day, rule in due]
+            shards = {ledger.shard_key(ledger.normalize_expense(dict(row))) for row in rows}
+            posted = {(exp["rule_id"], exp["date"]) for exp in ledger.load_shards(shards)["expenses"] if "rule_id" in exp}
+            added = ledger.add_many([row for row in rows if (row["rule_id"], row["date"]) not in posted])
+            for day, rule in due:
+                rule["posted_through"] = ledger.day_to_str(max(day, ledger.parse_day(rule["posted_through"] or rule["start"])))
+            save_rules(scheduler.store)
+        except BaseException:
+            # The heap moved past occurrences that may not be saved.
+            _scheduler[0] = None
+            raise
+        # The heap already matches the file just written; keep it.
+        scheduler.stamp = _rules_stamp()
+        _scheduler[0] = scheduler
+    return added
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recurring expenses.")
+    parser.add_argument("--upcoming", type=int, metavar="DAYS", default=None, help="list occurrences in the next DAYS days")
+    parser.add_argument("--post", action="store_true", help="add every occurrence due by today to the ledger")
+    args = parser.parse_args()
+    if args.post:
+        print(f"Posted {len(post_due())} scheduled expenses.")
+    for row in expand(today(), today() + (args.upcoming if args.upcoming is not None else 30)):
+        print(f"{row['date']} | {row['category']} | {row['amount']:.2f} | {row['description']} (rule {row['rule_id']})")
@@ -0,0 +1,136 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import multiprocessing
+import os
+
+import ledger
+from perf import timed
+
+
+# ------------------- Periods -------------------
+# A period is a month ("2024-03") or a whole year ("2024"); each renders to
+# one page with the category pie and a per-category summary table.
+def parse_period(text):
+    text = text.strip()
+    try:
+        if len(text) == 4:
+            int(text)
+            return text
+        year, month = text.split("-")
+        ledger.month_bounds(int(year), int(month))
+        return ledger.period_key(int(year), int(month))
+    except ValueError:
+        raise ValueError(f"Invalid period {text!r}; use YYYY or YYYY-MM.")
+
+def period_months(first, last):
+    # Every month from the first period through the last, as shard keys.
+    first, last = parse_period(first), parse_period(last)
+    first_day = ledger.month_bounds(int(first[:4]), int(first[5:7]) if len(first) > 4 else 1)[0]
+    last_day = ledger.month_bounds(int(last[:4]), int(last[5:7]) if len(last) > 4 else 12)[1]
+    return [ledger.period_key(year, month) for year, month in ledger.months_between(first_day, last_day)]
+
+def period_shards(period):
+    if len(period) == 4:
+        return [ledger.period_key(int(period), month) for month in range(1, 13)]
+    return [period]
+
+def period_title(period):
+    if len(period) == 4:
+        return f"Expenses - {period}"
+    return f"Expenses - {period[5:7]}/{period[:4]}"
+
+def period_summary(period):
+    groups = ledger.group_by(ledger.load_shards(period_shards(period))["expenses"], ("category",))
+    return sorted(((group[0], stats) for group, stats in groups.items()), key=lambda item: -item[1]["sum"])
+
+# ------------------- Rendering -------------------
+# Pages render in a process pool. Every worker forces the Agg backend and
+# keeps one Figure that is cleared between pages, so workers never share
+# pyplot state with each other or with the GUI process they forked from.
+REPORT_FORMATS = ("png", "pdf")
+TABLE_HEADER = ["Category", "Count", "Total", "Mean", "Min", "Max", "Share"]
+
+_figure = [None]
+
+def _init_worker(data_file):
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+    ledger.DATA_FILE = data_file
+    _figure[0] = None
+
+def _page_figure():
+    from charts import new_figure
+    if _figure[0] is None:
+        _figure[0] = new_figure(8.27, 11.69)
+    _figure[0].clear()
+    return _figure[0]
+
+def render_period(period, out_dir, fmt="png", currency="", dpi=150):
+    from charts import draw_category_pie, draw_message, draw_table
+
+    summary = period_summary(period)
+    figure = _page_figure()
+    pie_ax = figure.add_axes([0.05, 0.42, 0.9, 0.53])
+    table_ax = figure.add_axes([0.05, 0.03, 0.9, 0.36])
+    if summary:
+        total = sum(stats["sum"] for _, stats in summary)
+        draw_category_pie(pie_ax, {category: stats["sum"] for category, stats in summary}, period_title(period), currency)
+        rows = [
+            [category, stats["count"], f"{currency}{stats['sum']:.2f}", f"{currency}{stats['mean']:.2f}",
+             f"{currency}{stats['min']:.2f}", f"{currency}{stats['max']:.2f}", f"{stats['sum'] / total:.1%}"]
+            for category, stats in summary
+        ]
+        rows.append(["Total", sum(stats["count"] for _, stats in summary), f"{currency}{total:.2f}", "", "", "", "100.0%"])
+        draw_table(table_ax, TABLE_HEADER, rows)
+    else:
+        draw_message(pie_ax, f"No expenses for {period}.")
+        table_ax.axis("off")
+
+    path = os.path.join(out_dir, f"expenses_{period}.{fmt}")
+    figure.savefig(path, format=fmt, dpi=dpi)
+    return path
+
+def _pool(workers):
+    # fork when available so a call from the GUI does not re-import it.
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=_init_worker, initargs=(ledger.DATA_FILE,))
+
+@timed("render")
+def render_reports(periods, out_dir, fmt="png", currency="", workers=None):
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unsupported format {fmt!r}; use {' or '.join(REPORT_FORMATS)}.")
+    os.makedirs(out_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(periods))
+    if workers < 2:
+        _init_worker(ledger.DATA_FILE)
+        return [render_period(period, out_dir, fmt, currency) for period in periods]
+    with _pool(workers) as pool:
+        futures = [pool.submit(render_period, period, out_dir, fmt, currency) for period in periods]
+        return [future.result() for future in futures]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render category pies and summary tables for many periods.")
+    parser.add_argument("periods", nargs="*", help="periods to render, YYYY-MM or YYYY")
+    parser.add_argument("--from", dest="first", metavar="YYYY-MM", help="render every month from this one...")
+    parser.add_argument("--to", dest="last", metavar="YYYY-MM", help="...through this one")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="png")
+    parser.add_argument("--out", default="reports", help="output directory (default: %(default)s)")
+    parser.add_argument("--currency", default="")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--data", default=ledger.DATA_FILE, help="ledger location (default: %(default)s)")
+    args = parser.parse_args()
+    ledger.DATA_FILE = args.data
+
+    try:
+        periods = [parse_period(period) for period in args.periods]
+        if args.first or args.last:
+            periods += period_months(args.first or args.last, args.last or args.first)
+    except ValueError as e:
+        parser.error(str(e))
+    if not periods:
+        parser.error("give at least one period or a --from/--to range")
+
+    for path in render_reports(list(dict.fromkeys(periods)), args.out, args.format, args.currency, args.workers):
+        print(path)
@@ -0,0 +1,242 @@
+from bisect import bisect_left
+from collections import Counter
+import heapq
+import re
+import time
+
+import ledger
+from cache import query_cache
+from perf import timed
+
+
+# ------------------- Prefix Index -------------------
+# Descriptions are split into lowercase word tokens kept in a sorted list,
+# so all tokens sharing a prefix sit in one contiguous bisect range. Each
+# token maps to the positions of the rows that contain it.
+TOKEN_RE = re.compile(r"\w+")
+
+# Past this many previous results a fresh index lookup beats re-checking them.
+NARROW_LIMIT = 5000
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+class PrefixIndex:
+    def __init__(self, expenses):
+        self.expenses = expenses
+        postings = {}
+        for pos, exp in enumerate(expenses):
+            for token in set(tokenize(exp["description"])):
+                postings.setdefault(token, []).append(pos)
+        self.postings = postings
+        self.tokens = sorted(postings)
+
+    def tokens_with_prefix(self, prefix):
+        start = bisect_left(self.tokens, prefix)
+        end = start
+        while end < len(self.tokens) and self.tokens[end].startswith(prefix):
+            end += 1
+        return self.tokens[start:end]
+
+    def positions(self, prefix):
+        matched = set()
+        for token in self.tokens_with_prefix(prefix):
+            matched.update(self.postings[token])
+        return matched
+
+    @timed("query", "prefix_search")
+    def search(self, query):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Start from the rarest term so the intersection stays small.
+        candidates = sorted((self.positions(term) for term in terms), key=len)
+        matched = set.intersection(*candidates)
+        return [self.expenses[pos] for pos in sorted(matched)]
+
+def prefix_matcher(query):
+    terms = tokenize(query)
+
+    def matches(exp):
+        tokens = tokenize(exp["description"])
+        return all(any(token.startswith(term) for token in tokens) for term in terms)
+    return matches
+
+def store_index():
+    # Built from the whole ledger once per data version.
+    return query_cache.get_or_compute("prefix_index", None, lambda: PrefixIndex(ledger.load_data()["expenses"]))
+
+# ------------------- Incremental Search -------------------
+class IncrementalSearch:
+    def __init__(self, index_factory=store_index):
+        self.index_factory = index_factory
+        self.index = None
+        self.last_query = None
+        self.last_results = None
+
+    def search(self, query):
+        query = " ".join(tokenize(query))
+        index = self.index_factory()
+        if not query:
+            self.last_query, self.last_results = None, None
+            return []
+
+        if (index is self.index and self.last_query and query.startswith(self.last_query)
+                and len(self.last_results) <= NARROW_LIMIT):
+            # Extending the previous query can only narrow its results.
+            results = list(filter(prefix_matcher(query), self.last_results))
+        else:
+            results = index.search(query)
+
+        self.index = index
+        self.last_query, self.last_results = query, results
+        return results
+
+# ------------------- Fuzzy Matching -------------------
+# Typo-tolerant search runs over the distinct tokens of all descriptions,
+# which is far smaller than the ledger itself. Tokens live in a BK-tree
+# keyed by edit distance, so a lookup only visits subtrees that can hold a
+# match within the allowed distance.
+FUZZY_TOP_K = 10
+FUZZY_BUDGET_MS = 50
+
+def normalize_description(text):
+    return " ".join(tokenize(text))
+
+def edit_distance(a, b, limit=None):
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def max_token_distance(term):
+    return 0 if len(term) <= 2 else 1 if len(term) <= 5 else 2
+
+def similarity(a, b, distance):
+    return 1 - distance / max(len(a), len(b), 1)
+
+class BKTree:
+    def __init__(self, words=()):
+        self.root = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, max_distance, deadline=None):
+        if self.root is None:
+            return {}
+        found = {}
+        stack = [self.root]
+        while stack:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            node_word, children = stack.pop()
+            distance = edit_distance(word, node_word)
+            if distance <= max_distance:
+                found[node_word] = distance
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+class FuzzyIndex:
+    def __init__(self, expenses):
+        self.rows_by_desc = {}
+        for exp in expenses:
+            self.rows_by_desc.setdefault(normalize_description(exp["description"]), []).append(exp)
+        self.descs_by_token = {}
+        for desc in self.rows_by_desc:
+            for token in set(desc.split()):
+                self.descs_by_token.setdefault(token, []).append(desc)
+        self.tree = BKTree(self.descs_by_token)
+
+    @timed("query", "fuzzy_search")
+    def search(self, query, k=FUZZY_TOP_K, budget_ms=FUZZY_BUDGET_MS):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        deadline = time.perf_counter() + budget_ms / 1000
+
+        # For every term, the best (similarity, token) each description reaches.
+        hits = {}
+        for i, term in enumerate(terms):
+            for token, distance in self.tree.search(term, max_token_distance(term), deadline).items():
+                score = similarity(term, token, distance)
+                for desc in self.descs_by_token[token]:
+                    best = hits.setdefault(desc, [None] * len(terms))
+                    if best[i] is None or score > best[i][0]:
+                        best[i] = (score, token)
+
+        # Descriptions reached through the same tokens ("uber ride 101",
+        # "uber ride 102") form one result, so a long run of them cannot
+        # push a typo variant ("ubr ride") out of the top k.
+        groups = {}
+        for desc, best in hits.items():
+            key = tuple(hit[1] if hit else None for hit in best)
+            if key not in groups:
+                groups[key] = (sum(hit[0] for hit in best if hit) / len(terms), [])
+            groups[key][1].append(desc)
+
+        ranked = heapq.nlargest(
+            k, groups.values(),
+            key=lambda group: (group[0], sum(len(self.rows_by_desc[desc]) for desc in group[1])),
+        )
+        results = []
+        for score, descs in ranked:
+            descs.sort(key=lambda desc: -len(self.rows_by_desc[desc]))
+            results.append((descs[0], score, [exp for desc in descs for exp in self.rows_by_desc[desc]]))
+        return results
+
+def fuzzy_store_index():
+    return query_cache.get_or_compute("fuzzy_index", None, lambda: FuzzyIndex(ledger.load_data()["expenses"]))
+
+GROUP_CANDIDATES = 50
+
+def group_similar_descriptions(desc_counts, candidates=GROUP_CANDIDATES):
+    # Folds typo variants into the most frequent spelling: "grocey" and
+    # "grocery" count as one recurring entry. Only the most frequent
+    # descriptions can reach the dashboard, so only they are grouped.
+    # Words under six characters must match exactly ("car" is not "bar").
+    normalized = Counter()
+    for desc, count in desc_counts.items():
+        normalized[normalize_description(desc)] += count
+
+    tree = BKTree()
+    grouped = Counter()
+    for desc, count in normalized.most_common(candidates):
+        limit = 0 if len(desc) < 6 else min(3, len(desc) // 6)
+        matches = tree.search(desc, limit) if tree.root is not None else {}
+        head = min(matches, key=lambda m: (matches[m], -grouped[m])) if matches else None
+        if head is None:
+            tree.add(desc)
+            head = desc
+        grouped[head] += count
+    return grouped
@@ -0,0 +1,400 @@
+from collections import Counter
+import atexit
+import heapq
+import json
+import math
+import os
+import zlib
+
+import ledger
+from perf import timed
+
+
+# ------------------- Space-Saving -------------------
+# Tracks the heaviest items of a stream in a fixed number of counters.
+# Each kept item carries (count, error): its true frequency lies in
+# [count - error, count], and error never exceeds total / capacity.
+class SpaceSaving:
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counters = {}
+        self.heap = []
+        self.total = 0
+
+    def add(self, item, count=1):
+        self.total += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            counter = self.counters[item] = [count, 0]
+        else:
+            floor, victim = self._pop_min()
+            del self.counters[victim]
+            counter = self.counters[item] = [floor + count, floor]
+        heapq.heappush(self.heap, (counter[0], item))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(c[0], i) for i, c in self.counters.items()]
+            heapq.heapify(self.heap)
+
+    def _pop_min(self):
+        # Heap entries go stale when a counter grows; skip those lazily.
+        while True:
+            count, item = heapq.heappop(self.heap)
+            counter = self.counters.get(item)
+            if counter is not None and counter[0] == count:
+                return count, item
+
+    def top(self, k=1):
+        ranked = sorted(self.counters.items(), key=lambda entry: (-entry[1][0], entry[1][1]))
+        return [(item, count, error) for item, (count, error) in ranked[:k]]
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "total": self.total, "counters": list(self.counters.items())}
+
+    @classmethod
+    def from_dict(cls, payload):
+        sketch = cls(payload["capacity"])
+        sketch.total = payload["total"]
+        sketch.counters = {item: counter for item, counter in payload["counters"]}
+        sketch.heap = [(counter[0], item) for item, counter in sketch.counters.items()]
+        heapq.heapify(sketch.heap)
+        return sketch
+
+# ------------------- Count-Min -------------------
+# Point estimates for any item in width * depth counters. Estimates never
+# undercount and overshoot by at most e / width * total with probability
+# 1 - exp(-depth). crc32 keeps hashing stable across processes.
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+        self.total = 0
+
+    def _cells(self, item):
+        data = str(item).encode("utf-8")
+        return [(row, zlib.crc32(data, row) % self.width) for row in range(self.depth)]
+
+    def add(self, item, count=1):
+        self.total += count
+        for row, col in self._cells(item):
+            self.rows[row][col] += count
+
+    def estimate(self, item):
+        return min(self.rows[row][col] for row, col in self._cells(item))
+
+    def to_dict(self):
+        return {"width": self.width, "depth": self.depth, "total": self.total, "rows": self.rows}
+
+    @classmethod
+    def from_dict(cls, payload):
+        sketch = cls(payload["width"], payload["depth"])
+        sketch.total = payload["total"]
+        sketch.rows = payload["rows"]
+        return sketch
+
+# ------------------- Dashboard Sketches -------------------
+# Incrementally maintained replacements for the dashboard's Counters.
+# Descriptions are unbounded and use Space-Saving plus Count-Min. Categories
+# and calendar days are bounded by nature (days by 366 per year), and their
+# near-uniform counts sit below Space-Saving's error bound, so they stay
+# exact counters. Count, total and the extreme amounts are kept too, so
+# an approximate dashboard never needs the rows themselves.
+SKETCH_FILE = "sketches.json"
+APPROX_THRESHOLD = 100_000
+
+class UsageSketches:
+    def __init__(self, capacity=1000):
+        self.descriptions = SpaceSaving(capacity)
+        self.description_counts = CountMinSketch()
+        self.days = Counter()
+        self.categories = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.highest = None
+        self.lowest = None
+        self.version = None
+
+    def add(self, exp):
+        desc = exp["description"].strip().lower()
+        self.descriptions.add(desc)
+        self.description_counts.add(desc)
+        self.days[exp["day"]] += 1
+        self.categories[exp["category"]] += 1
+        self.count += 1
+        self.total += exp["amount"]
+        if self.highest is None or exp["amount"] > self.highest[0]:
+            self.highest = [exp["amount"], exp["date"]]
+        if self.lowest is None or exp["amount"] < self.lowest:
+            self.lowest = exp["amount"]
+
+    def top_descriptions(self, k=10):
+        # Space-Saving counts are upper bounds, Count-Min tightens them.
+        return Counter({
+            desc: min(count, self.description_counts.estimate(desc))
+            for desc, count, _ in self.descriptions.top(k)
+        })
+
+    def most_active_day(self):
+        top = self.days.most_common(1)
+        return (ledger.day_to_str(top[0][0]), top[0][1]) if top else ("N/A", 0)
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "descriptions": self.descriptions.to_dict(),
+            "description_counts": self.description_counts.to_dict(),
+            "days": list(self.days.items()),
+            "categories": dict(self.categories),
+            "count": self.count,
+            "total": self.total,
+            "highest": self.highest,
+            "lowest": self.lowest,
+        }
+
+    @classmethod
+    def from_dict(cls, payload):
+        sketches = cls()
+        sketches.version = payload["version"]
+        sketches.descriptions = SpaceSaving.from_dict(payload["descriptions"])
+        sketches.description_counts = CountMinSketch.from_dict(payload["description_counts"])
+        sketches.days = Counter({int(day): count for day, count in payload["days"]})
+        sketches.categories = Counter(payload["categories"])
+        sketches.count = payload["count"]
+        sketches.total = payload["total"]
+        sketches.highest = payload["highest"]
+        sketches.lowest = payload["lowest"]
+        return sketches
+
+_usage = [None]
+
+def _sketch_path():
+    return os.path.join(ledger.partition_dir(), SKETCH_FILE)
+
+def _load_cached(path, from_dict):
+    # A missing, partial or outdated file is a cache miss, not an error.
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return from_dict(json.load(f))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+# Change listeners only update the copy in memory. The file is written
+# when a structure is rebuilt, and once at exit if it was updated since
+# and still matches the ledger, instead of on every write.
+_unsaved = {}
+
+def _save_unsaved():
+    version = ledger.data_version()
+    for path, structure in list(_unsaved.items()):
+        if structure.version == version and os.path.isdir(os.path.dirname(path)):
+            ledger._write_json(path, structure.to_dict())
+    _unsaved.clear()
+
+atexit.register(_save_unsaved)
+
+def save_sketches(sketches):
+    os.makedirs(ledger.partition_dir(), exist_ok=True)
+    ledger._write_json(_sketch_path(), sketches.to_dict())
+
+@timed("aggregate")
+def usage_sketches():
+    version = ledger.data_version()
+    sketches = _usage[0]
+    if sketches is None:
+        sketches = _load_cached(_sketch_path(), UsageSketches.from_dict)
+    if sketches is None or sketches.version != version:
+        # Stream every shard once; memory stays bounded by the sketches.
+        sketches = UsageSketches()
+        for row in ledger.iter_rows():
+            sketches.add(ledger.normalize_expense(dict(row)))
+        sketches.version = version
+        save_sketches(sketches)
+        _unsaved.pop(_sketch_path(), None)
+    _usage[0] = sketches
+    return sketches
+
+def use_approximate(mode="auto"):
+    if mode == "auto":
+        return sum(p["count"] for p in ledger.load_manifest()["partitions"].values()) >= APPROX_THRESHOLD
+    return mode == "approximate"
+
+def _on_ledger_change(event, rows):
+    sketches = _usage[0]
+    if sketches is None:
+        return
+    version = ledger.data_version()
+    if event == "add" and sketches.version == version - 1:
+        for exp in rows:
+            sketches.add(exp)
+        sketches.version = version
+        _unsaved[_sketch_path()] = sketches
+    else:
+        # Space-Saving cannot forget items; rebuild on the next read.
+        sketches.version = None
+
+ledger.subscribe(_on_ledger_change)
+
+# ------------------- Quantiles -------------------
+# Log-bucketed histogram in the style of DDSketch: every amount lands in
+# bucket ceil(log_gamma(x)), so any quantile is answered within
+# relative_accuracy of the true value from a few hundred buckets. Unlike
+# t-digest or KLL, a bucket can simply be decremented, so deletes and
+# edits are applied in place.
+QUANTILE_FILE = "quantiles.json"
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _bucket(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value, count=1):
+        self.count += count
+        if value <= 0:
+            self.zero_count += count
+            return
+        key = self._bucket(value)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def remove(self, value):
+        self.add(value, -1)
+        if value > 0:
+            key = self._bucket(value)
+            if self.buckets.get(key, 0) <= 0:
+                self.buckets.pop(key, None)
+
+    def quantile(self, q):
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {"relative_accuracy": self.relative_accuracy, "zero_count": self.zero_count,
+                "count": self.count, "buckets": list(self.buckets.items())}
+
+    @classmethod
+    def from_dict(cls, payload):
+        sketch = cls(payload["relative_accuracy"])
+        sketch.zero_count = payload["zero_count"]
+        sketch.count = payload["count"]
+        sketch.buckets = {key: count for key, count in payload["buckets"]}
+        return sketch
+
+class AmountQuantiles:
+    def __init__(self):
+        self.overall = QuantileSketch()
+        self.by_category = {}
+        self.by_month = {}
+        self.version = None
+
+    def _sketches(self, exp):
+        category = exp["category"]
+        month = ledger.shard_key(exp)
+        if category not in self.by_category:
+            self.by_category[category] = QuantileSketch()
+        if month not in self.by_month:
+            self.by_month[month] = QuantileSketch()
+        return self.overall, self.by_category[category], self.by_month[month]
+
+    def add(self, exp):
+        amount = exp["amount"]
+        for sketch in self._sketches(exp):
+            sketch.add(amount)
+
+    def remove(self, exp):
+        amount = exp["amount"]
+        for sketch in self._sketches(exp):
+            sketch.remove(amount)
+
+    def summary(self, category=None, month=None):
+        if category is not None:
+            sketch = self.by_category.get(category)
+        elif month is not None:
+            sketch = self.by_month.get(month)
+        else:
+            sketch = self.overall
+        if sketch is None or sketch.count <= 0:
+            return {"median": None, "p90": None, "p99": None}
+        return {"median": sketch.quantile(0.5), "p90": sketch.quantile(0.9), "p99": sketch.quantile(0.99)}
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "overall": self.overall.to_dict(),
+            "by_category": {key: sketch.to_dict() for key, sketch in self.by_category.items()},
+            "by_month": {key: sketch.to_dict() for key, sketch in self.by_month.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, payload):
+        quantiles = cls()
+        quantiles.version = payload["version"]
+        quantiles.overall = QuantileSketch.from_dict(payload["overall"])
+        quantiles.by_category = {key: QuantileSketch.from_dict(p) for key, p in payload["by_category"].items()}
+        quantiles.by_month = {key: QuantileSketch.from_dict(p) for key, p in payload["by_month"].items()}
+        return quantiles
+
+_quantiles = [None]
+
+def _quantile_path():
+    return os.path.join(ledger.partition_dir(), QUANTILE_FILE)
+
+def save_quantiles(quantiles):
+    os.makedirs(ledger.partition_dir(), exist_ok=True)
+    ledger._write_json(_quantile_path(), quantiles.to_dict())
+
+@timed("aggregate")
+def amount_quantiles():
+    version = ledger.data_version()
+    quantiles = _quantiles[0]
+    if quantiles is None:
+        quantiles = _load_cached(_quantile_path(), AmountQuantiles.from_dict)
+    if quantiles is None or quantiles.version != version:
+        quantiles = AmountQuantiles()
+        for row in ledger.iter_rows():
+            quantiles.add(ledger.normalize_expense(dict(row)))
+        quantiles.version = version
+        save_quantiles(quantiles)
+        _unsaved.pop(_quantile_path(), None)
+    _quantiles[0] = quantiles
+    return quantiles
+
+def _on_quantile_change(event, rows):
+    quantiles = _quantiles[0]
+    if quantiles is None:
+        return
+    version = ledger.data_version()
+    if quantiles.version != version - 1:
+        quantiles.version = None
+        return
+    for row in rows:
+        if event == "add":
+            quantiles.add(row)
+        elif event == "delete":
+            quantiles.remove(row)
+        elif event == "update":
+            old, new = row
+            quantiles.remove(old)
+            quantiles.add(new)
+    quantiles.version = version
+    _unsaved[_quantile_path()] = quantiles
+
+ledger.subscribe(_on_quantile_change)
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+import ledger
+import recurring
+import sketches
+from cache import query_cache
+from benchmarks.synthetic import generate_expenses
+
+
+@pytest.fixture(autouse=True)
+def data_file(tmp_path, monkeypatch):
+    # Every test gets its own empty ledger and cold caches.
+    path = str(tmp_path / "expenses.json")
+    monkeypatch.setattr(ledger, "DATA_FILE", path)
+    monkeypatch.setattr(ledger, "_version_stamp", [None, 0])
+    monkeypatch.setattr(analytics, "_daily", [None])
+    monkeypatch.setattr(sketches, "_usage", [None])
+    monkeypatch.setattr(sketches, "_quantiles", [None])
+    monkeypatch.setattr(sketches, "_unsaved", {})
+    monkeypatch.setattr(recurring, "_scheduler", [None])
+    ledger.clear_partition_cache()
+    query_cache.clear()
+    yield path
+    ledger.clear_partition_cache()
+    query_cache.clear()
+
+@pytest.fixture
+def stored_expenses():
+    rows = generate_expenses(2000, seed=7, years=2)
+    ledger.add_many(rows)
+    return ledger.load_data()["expenses"]
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+import analytics
+import ledger
+from analytics import DailyTotals, FenwickTree
+
+
+def test_fenwick_range_sums_match_brute_force():
+    rng = random.Random(5)
+    values = [round(rng.uniform(-50, 200), 2) for _ in range(300)]
+    tree = FenwickTree(values)
+    for _ in range(200):
+        i = rng.randrange(len(values))
+        delta = round(rng.uniform(-20, 20), 2)
+        values[i] += delta
+        tree.add(i, delta)
+        lo, hi = sorted(rng.randrange(-5, len(values) + 5) for _ in range(2))
+        expected = sum(values[max(lo, 0):min(hi, len(values) - 1) + 1])
+        assert tree.range_sum(lo, hi) == pytest.approx(expected, abs=1e-6)
+
+def brute_total(expenses, first, last, category=None):
+    rows = [exp for exp in expenses if first <= exp["day"] <= last
+            and (category is None or exp["category"].lower() == category.lower())]
+    return sum(exp["amount"] for exp in rows), len(rows)
+
+def check_ranges(totals, expenses, seed):
+    rng = random.Random(seed)
+    days = [exp["day"] for exp in expenses]
+    for _ in range(100):
+        first, last = sorted(rng.sample(days, 2))
+        category = rng.choice([None, "food", "Home", "Work"])
+        total, count = brute_total(expenses, first, last, category)
+        assert totals.total(first, last, category) == pytest.approx(total, abs=1e-6)
+        assert totals.count(first, last, category) == count
+
+def test_daily_totals_match_brute_force(stored_expenses):
+    check_ranges(DailyTotals(stored_expenses), stored_expenses, seed=1)
+
+def test_daily_totals_follow_writes(stored_expenses):
+    totals = analytics.daily_totals()
+    ledger.add_many([{"description": "Rent", "amount": 900, "date": "2025-03-01", "category": "Home"}])
+    ledger.update_record(stored_expenses[0], {"amount": 1.0, "category": "Work"})
+    ledger.delete_record(stored_expenses[1]["id"])
+    # Patched in place by the change listener, not rebuilt.
+    assert analytics.daily_totals() is totals
+    check_ranges(totals, ledger.load_data()["expenses"], seed=2)
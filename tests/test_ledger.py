@@ -0,0 +1,68 @@
+import json
+import os
+
+import ledger
+
+
+def shard_path(key):
+    return os.path.join(ledger.partition_dir(), f"{key}.json")
+
+def read_shard(key):
+    with open(shard_path(key), encoding="utf-8") as file:
+        return json.load(file)
+
+def copy_into_later_shard():
+    # What a move cut short between its two shard writes leaves behind.
+    ledger.add_many([
+        {"description": "Lunch", "amount": 10, "date": "2025-10-01", "category": "Food"},
+        {"description": "Taxi", "amount": 20, "date": "2025-11-01", "category": "Work"},
+    ])
+    rows = read_shard("2025-11") + [dict(read_shard("2025-10")[0], amount=99.0, date="2025-11-05")]
+    with open(shard_path("2025-11"), "w", encoding="utf-8") as file:
+        json.dump(rows, file)
+    ledger.clear_partition_cache()
+
+def test_cross_shard_duplicate_is_hidden():
+    copy_into_later_shard()
+    expenses = ledger.load_data()["expenses"]
+    assert [exp["id"] for exp in expenses] == [1, 2]
+    assert expenses[0]["amount"] == 10.0
+    assert [row["id"] for row in ledger.iter_rows()] == [1, 2]
+
+def test_cross_shard_duplicate_lookup_finds_owner_in_any_read_order():
+    copy_into_later_shard()
+    ledger.load_data(periods=[(2025, 11)])
+    key, exp = ledger.find_record(1)
+    assert key == "2025-10" and exp["amount"] == 10.0
+
+def test_update_edits_owner_and_keeps_hidden_copy():
+    copy_into_later_shard()
+    _, exp = ledger.find_record(1)
+    ledger.update_record(exp, {"amount": 12.0})
+    assert read_shard("2025-10")[0]["amount"] == 12.0
+    assert [row["id"] for row in read_shard("2025-11")] == [2, 1]
+    assert [exp["amount"] for exp in ledger.load_data()["expenses"]] == [12.0, 20.0]
+
+def test_repair_quarantines_later_copy():
+    copy_into_later_shard()
+    report = ledger.validation_report()
+    assert report["shards"] == ["2025-11"]
+    assert report["rejected"][0]["reason"] == "duplicate id (kept in 2025-10)"
+
+    ledger.repair_ledger()
+    ledger.clear_partition_cache()
+    assert ledger.validation_report()["shards"] == []
+    assert [row["id"] for row in read_shard("2025-11")] == [2]
+    with open(os.path.join(ledger.partition_dir(), ledger.QUARANTINE_NAME), encoding="utf-8") as file:
+        assert [item["row"]["amount"] for item in json.load(file)] == [99.0]
+
+def test_move_across_shards_leaves_one_copy(stored_expenses):
+    exp = stored_expenses[0]
+    moved = ledger.update_record(exp, {"date": "2019-01-01"})
+    assert ledger.find_record(exp["id"])[0] == "2019-01"
+    assert [e["id"] for e in ledger.load_data()["expenses"]].count(moved["id"]) == 1
+    assert ledger.validation_report()["shards"] == []
+
+def test_writes_leave_no_temp_files(stored_expenses):
+    ledger.add_many([{"description": "Cafe", "amount": 4, "date": "2025-05-05", "category": "Food"}])
+    assert not [name for name in os.listdir(ledger.partition_dir()) if name.endswith(".tmp")]
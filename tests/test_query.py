@@ -0,0 +1,51 @@
+import random
+
+import ledger
+from query import LedgerIndex, Query
+
+
+def random_queries(expenses, count, seed=1):
+    rng = random.Random(seed)
+    days = [exp["day"] for exp in expenses]
+    amounts = [exp["amount"] for exp in expenses]
+    categories = sorted({exp["category"] for exp in expenses})
+    for _ in range(count):
+        query = Query()
+        if rng.random() < 0.5:
+            query = query.where_category(rng.choice(categories))
+        if rng.random() < 0.5:
+            first, last = sorted(rng.sample(days, 2))
+            query = query.between_days(first, last)
+        if rng.random() < 0.5:
+            low, high = sorted(rng.sample(amounts, 2))
+            query = rng.choice([
+                query.amount_between(low, high), query.amount_above(low), query.amount_below(high),
+            ])
+        if rng.random() < 0.3:
+            query = query.matching(rng.choice(["uber", "rent", "#1", "cafe"]))
+        yield query
+
+def scan(expenses, query):
+    return [exp for exp in expenses if query.matcher()(exp)]
+
+def test_index_matches_scan(stored_expenses):
+    index = LedgerIndex(list(stored_expenses))
+    for query in random_queries(stored_expenses, 200):
+        assert query.run(index=index) == scan(stored_expenses, query), query.describe()
+
+def test_stored_query_matches_scan(stored_expenses):
+    for query in random_queries(stored_expenses, 50, seed=2):
+        assert query.run() == scan(stored_expenses, query), query.describe()
+
+def test_index_add_keeps_results_in_step(stored_expenses):
+    index = LedgerIndex(list(stored_expenses[:1000]))
+    for exp in stored_expenses[1000:]:
+        index.add(exp)
+    for query in random_queries(stored_expenses, 100, seed=3):
+        assert query.run(index=index) == scan(stored_expenses, query), query.describe()
+
+def test_stored_query_sees_new_rows(stored_expenses):
+    query = Query().where_category("Food").on("2025-06-15")
+    before = query.run()
+    added = ledger.add_many([{"description": "Bakery", "amount": 12.5, "date": "2025-06-15", "category": "Food"}])
+    assert query.run() == before + added
@@ -0,0 +1,50 @@
+import pytest
+
+import ledger
+import recurring
+
+
+def posted_rows():
+    return [exp for exp in ledger.load_data()["expenses"] if "rule_id" in exp]
+
+def test_post_due_is_idempotent():
+    recurring.add_rule("Rent", 900, "Home", "monthly", "2025-01-31")
+    recurring.add_rule("Gym", 15, "Other", "weekly", "2025-02-03", end="2025-03-03")
+    through = ledger.parse_day("2025-04-15")
+
+    added = recurring.post_due(through)
+    assert recurring.post_due(through) == []
+    recurring._scheduler[0] = None
+    assert recurring.post_due(through) == []
+
+    rows = posted_rows()
+    assert len(rows) == len(added) == 3 + 5
+    # The 31st is clamped to the end of shorter months.
+    assert [row["date"] for row in rows if row["rule_id"] == 1] == ["2025-01-31", "2025-02-28", "2025-03-31"]
+    assert len({(row["rule_id"], row["date"]) for row in rows}) == len(rows)
+
+def test_post_due_skips_occurrences_already_posted(monkeypatch):
+    recurring.add_rule("Rent", 900, "Home", "monthly", "2025-01-01")
+    through = ledger.parse_day("2025-03-15")
+
+    save_rules = recurring.save_rules
+
+    def lost_write(store):
+        raise OSError("disk full")
+    monkeypatch.setattr(recurring, "save_rules", lost_write)
+    with pytest.raises(OSError):
+        recurring.post_due(through)
+    monkeypatch.setattr(recurring, "save_rules", save_rules)
+
+    # The rows landed but posted_through did not; nothing is posted twice.
+    assert recurring.post_due(through) == []
+    assert [row["date"] for row in posted_rows()] == ["2025-01-01", "2025-02-01", "2025-03-01"]
+
+def test_due_items_do_not_consume_the_schedule():
+    recurring.add_rule("Netflix", 9.99, "Entertainment", "monthly", "2025-01-10")
+    through = ledger.parse_day("2025-02-20")
+    first = recurring.due_items(through)
+    assert [ledger.day_to_str(day) for day, _ in first] == ["2025-01-10", "2025-02-10"]
+    assert recurring.due_items(through) == first
+    assert len(recurring.post_due(through)) == 2
+    assert recurring.due_items(through) == []
@@ -0,0 +1,83 @@
+import math
+import random
+from collections import Counter
+
+import ledger
+import sketches
+from sketches import CountMinSketch, QuantileSketch, SpaceSaving
+
+
+def zipf_stream(items, length, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(items)]
+    return rng.choices([f"item {i}" for i in range(items)], weights=weights, k=length)
+
+def test_space_saving_bounds():
+    stream = zipf_stream(5000, 50_000, seed=1)
+    exact = Counter(stream)
+    sketch = SpaceSaving(capacity=200)
+    for item in stream:
+        sketch.add(item)
+    assert sketch.total == len(stream)
+    for item, count, error in sketch.top(200):
+        assert count - error <= exact[item] <= count
+        assert error <= sketch.total / sketch.capacity
+    # Anything more frequent than total / capacity is guaranteed a counter.
+    for item, true_count in exact.items():
+        if true_count > sketch.total / sketch.capacity:
+            assert item in sketch.counters
+
+def test_count_min_bounds():
+    stream = zipf_stream(5000, 50_000, seed=2)
+    exact = Counter(stream)
+    sketch = CountMinSketch(width=512, depth=4)
+    for item in stream:
+        sketch.add(item)
+    slack = math.e / sketch.width * sketch.total
+    misses = 0
+    for item, true_count in exact.items():
+        estimate = sketch.estimate(item)
+        assert estimate >= true_count
+        misses += estimate - true_count > slack
+    # Each estimate stays within slack with probability 1 - exp(-depth).
+    assert misses <= len(exact) * math.exp(-sketch.depth) * 2
+
+def test_quantile_relative_accuracy():
+    rng = random.Random(3)
+    values = sorted(round(rng.lognormvariate(5, 1.2), 2) for _ in range(20_000))
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999):
+        true = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - true) <= 0.01 * true + 1e-9
+
+def test_quantile_remove_matches_rebuild():
+    rng = random.Random(4)
+    values = [round(rng.uniform(1, 500), 2) for _ in range(2000)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    for value in values[:500]:
+        sketch.remove(value)
+    fresh = QuantileSketch()
+    for value in values[500:]:
+        fresh.add(value)
+    assert sketch.count == fresh.count
+    assert sketch.buckets == fresh.buckets
+
+def test_usage_sketches_follow_adds(stored_expenses):
+    usage = sketches.usage_sketches()
+    ledger.add_many([{"description": "Cafe", "amount": 3.0, "date": "2025-01-02", "category": "Food"}] * 5)
+    assert sketches.usage_sketches() is usage
+    rows = ledger.load_data()["expenses"]
+    assert usage.count == len(rows)
+    assert usage.categories == Counter(exp["category"] for exp in rows)
+    assert usage.days == Counter(exp["day"] for exp in rows)
+
+def test_approximate_dashboard_matches_exact_totals(stored_expenses):
+    exact = ledger.dashboard_metrics(stored_expenses)
+    approximate = ledger.dashboard_metrics(None, sketches=sketches.usage_sketches())
+    for field in ("total_entries", "total_categories", "highest_expense", "lowest_expense", "most_active_day"):
+        assert approximate[field] == exact[field]
+    assert abs(approximate["total_spent"] - exact["total_spent"]) < 1e-6